@@ -0,0 +1,202 @@
+# batch.py
+
+import argparse
+import inspect
+import json
+import multiprocessing
+import os
+import sys
+import time
+from cube import SOLVED_STATE, parse_moves
+from cubie import move_table
+from pruning import pattern_database
+from solver import a_star_solve, bidirectional_solve, ida_star_solve, two_phase_solve
+from twophase import prepare_tables
+
+ENGINES = {
+    'two_phase': two_phase_solve,
+    'ida': ida_star_solve,
+    'a_star': a_star_solve,
+    'bidirectional': bidirectional_solve,
+}
+
+
+def parse_scramble(text):
+    """Split a scramble like "R U2 F'" into moves. Raises ValueError on unknown notation."""
+    return parse_moves(text)
+
+
+def check_options(engine, options):
+    """Raise ValueError unless `engine` takes every keyword in `options`."""
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r} (expected one of {', '.join(ENGINES)}).")
+    accepted = set(inspect.signature(ENGINES[engine]).parameters) - {'start_cube', 'timeout'}
+    unknown = sorted(set(options) - accepted)
+    if unknown:
+        raise ValueError(f"Engine {engine!r} does not take {', '.join(unknown)} "
+                         f"(options: {', '.join(sorted(accepted))}).")
+
+
+def read_scrambles(stream, fmt='auto'):
+    """
+    Yield (id, scramble text) from a text stream, lazily.
+    - lines: one scramble per line, id = line number.
+    - jsonl: one object per line, {"id": ..., "scramble": "R U ..." or [moves]};
+      a missing id defaults to the line number.
+    - auto: jsonl for lines starting with '{', plain text otherwise.
+    Blank lines and lines starting with '#' are skipped. A JSONL line that
+    cannot be read is yielded as its error record instead, {'id', 'scramble',
+    'error'}, which solve_batch passes through as that line's result.
+    """
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if fmt == 'jsonl' or (fmt == 'auto' and line.startswith('{')):
+            record = None
+            try:
+                record = json.loads(line)
+                scramble = record['scramble']
+                if not isinstance(scramble, str):
+                    scramble = ' '.join(scramble)
+            except (ValueError, KeyError, TypeError) as exc:
+                scramble_id = record.get('id', number) if isinstance(record, dict) else number
+                error = "missing 'scramble'" if isinstance(exc, KeyError) else f"bad record: {exc}"
+                yield {'id': scramble_id, 'scramble': line, 'error': error}
+                continue
+            yield record.get('id', number), scramble
+        else:
+            yield number, line
+
+
+def prepare_engine(engine):
+    """Load (or build) the tables an engine needs, so no solve pays for them."""
+    if engine == 'two_phase':
+        prepare_tables()
+    elif engine == 'ida':
+        for coord in ('twist', 'flip', 'corners', 'slice_sorted'):
+            move_table(coord)
+        for name in ('corners', 'twist_slice', 'flip_slice'):
+            pattern_database(name)
+
+
+_ENGINE = None
+
+
+def _init_worker(engine):
+    global _ENGINE
+    _ENGINE = engine
+    # A no-op with fork (tables come from the parent); loads the mmap'ed files with spawn
+    prepare_engine(engine)
+
+
+def _solve_one(job):
+    """Worker task: solve one scramble and return its result record."""
+    if isinstance(job, dict):
+        return job  # an input line read_scrambles could not parse
+    scramble_id, text, timeout, options = job
+    result = {'id': scramble_id, 'scramble': text}
+    try:
+        moves = parse_scramble(text)
+    except ValueError as exc:
+        result['error'] = str(exc)
+        return result
+    cube = SOLVED_STATE.apply_moves(moves).to_cube()
+    start = time.perf_counter()
+    try:
+        solution = ENGINES[_ENGINE](cube, timeout=timeout, **options)
+    except Exception as exc:
+        # One failing scramble must not abort the whole batch
+        result['error'] = f"{type(exc).__name__}: {exc}"
+        return result
+    result['seconds'] = time.perf_counter() - start
+    result['solution'] = None if solution is None else ' '.join(solution)
+    result['length'] = None if solution is None else len(solution)
+    return result
+
+
+def solve_batch(scrambles, engine='two_phase', workers=None, timeout=10, **options):
+    """
+    Solve an iterable of (id, scramble text) on a pool of worker processes
+    (error records from read_scrambles are passed through as results),
+    yielding one result dict per scramble as soon as it finishes (completion
+    order, not input order). Input is consumed lazily.
+    Tables are loaded once in this process before the pool starts, so forked
+    workers share them; the pattern databases are mmap'ed files either way.
+    Extra keyword options go to the engine (e.g. target_length for
+    two_phase, metric for ida / a_star).
+    Result keys: id, scramble, and either error, or solution (None if not
+    solved within `timeout`), length and seconds. Raises ValueError for an
+    unknown engine or an option it does not take.
+    """
+    check_options(engine, options)
+    prepare_engine(engine)
+    jobs = (item if isinstance(item, dict) else (item[0], item[1], timeout, options) for item in scrambles)
+    with multiprocessing.Pool(workers or os.cpu_count(), initializer=_init_worker, initargs=(engine,)) as pool:
+        yield from pool.imap_unordered(_solve_one, jobs)
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(results, elapsed):
+    """Throughput and latency summary for a list of result dicts."""
+    latencies = [r['seconds'] for r in results if 'seconds' in r]
+    solved = sum(1 for r in results if r.get('solution') is not None)
+    return {
+        'scrambles': len(results),
+        'solved': solved,
+        'unsolved': len(latencies) - solved,
+        'errors': len(results) - len(latencies),
+        'seconds': elapsed,
+        'solves_per_sec': solved / elapsed if elapsed else 0.0,
+        'p50_seconds': percentile(latencies, 50) if latencies else None,
+        'p99_seconds': percentile(latencies, 99) if latencies else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m batch',
+                                     description="Solve many scrambles on a worker pool, streaming JSONL results.")
+    parser.add_argument('input', nargs='?', default='-', help="Scramble file (default: stdin).")
+    parser.add_argument('--format', choices=('auto', 'lines', 'jsonl'), default='auto',
+                        help="Input format (default: auto-detect per line).")
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='two_phase')
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores).")
+    parser.add_argument('--timeout', type=float, default=10, help="Per-scramble timeout in seconds.")
+    parser.add_argument('--target-length', type=int, default=None,
+                        help="two_phase: stop refining at this many moves (default: refine until the timeout).")
+    parser.add_argument('--output', default='-', help="Result file (default: stdout).")
+    args = parser.parse_args(argv)
+    if args.target_length is not None and args.engine != 'two_phase':
+        parser.error("--target-length only applies to --engine two_phase")
+    options = {} if args.target_length is None else {'target_length': args.target_length}
+
+    source = sys.stdin if args.input == '-' else open(args.input)
+    sink = sys.stdout if args.output == '-' else open(args.output, 'w')
+    results = []
+    start_time = time.perf_counter()
+    try:
+        for result in solve_batch(read_scrambles(source, args.format), args.engine, args.workers,
+                                  args.timeout, **options):
+            results.append(result)
+            sink.write(json.dumps(result) + '\n')
+            sink.flush()
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    summary = summarize(results, time.perf_counter() - start_time)
+    p50, p99 = summary['p50_seconds'], summary['p99_seconds']
+    print(f"{summary['solved']}/{summary['scrambles']} solved ({summary['errors']} invalid) in "
+          f"{summary['seconds']:.1f}s: {summary['solves_per_sec']:.2f} solves/s, "
+          f"p50 {p50 or 0:.3f}s, p99 {p99 or 0:.3f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
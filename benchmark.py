@@ -0,0 +1,396 @@
+# benchmark.py
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import timeit
+import tracemalloc
+from heapq import heappop, heappush
+from batch import ENGINES, prepare_engine
+from cube import RubiksCube, CubeState, StateBatch, apply_move_to_state
+from endgame import endgame_table
+from pruning import pattern_database
+from solver import (_a_star_search, anytime_solve, canonicalize, heuristic, is_redundant,
+                    parallel_a_star_solve)
+
+MOVES = ['U', "U'", 'D', "D'", 'F', "F'", 'B', "B'", 'L', "L'", 'R', "R'"]
+
+
+def _legacy_expand(cube):
+    """One node expansion the way a_star_solve used to do it: copy + _face_move per move."""
+    for move in MOVES:
+        child = RubiksCube(cube.state[:])
+        child._face_move(move[0], prime=len(move) > 1)
+
+
+def _table_expand(cube):
+    """Same expansion through the precompiled move permutations."""
+    for move in MOVES:
+        child = cube.copy()
+        child.apply_move(move)
+
+
+def _tuple_expand(state):
+    """Expansion on a bare tuple state, as the search loop does it."""
+    for move in MOVES:
+        apply_move_to_state(state, move)
+
+
+def bench_apply_move(number=20000, repeat=5):
+    """
+    Microbenchmark: time per expanded node (12 children) for the legacy
+    sticker-loop move path vs the compiled permutation path.
+    Returns a dict with microseconds per node and the speedup.
+    """
+    cube = RubiksCube()
+    for move in ['U', "R'", 'F', 'L', "D'", 'B']:
+        cube.apply_move(move)
+    legacy = min(timeit.repeat(lambda: _legacy_expand(cube), number=number, repeat=repeat)) / number
+    table = min(timeit.repeat(lambda: _table_expand(cube), number=number, repeat=repeat)) / number
+    state = tuple(cube.state)
+    raw = min(timeit.repeat(lambda: _tuple_expand(state), number=number, repeat=repeat)) / number
+    return {
+        'legacy_us_per_node': legacy * 1e6,
+        'table_us_per_node': table * 1e6,
+        'tuple_us_per_node': raw * 1e6,
+        'speedup': legacy / table,
+        'tuple_speedup': legacy / raw,
+    }
+
+
+def _collect_states(n):
+    """Breadth-first walk from solved until `n` distinct CubeStates are collected."""
+    frontier = [CubeState.solved()]
+    seen = {frontier[0]}
+    while len(seen) < n:
+        next_frontier = []
+        for state in frontier:
+            for move in MOVES:
+                child = state.apply(move)
+                if child not in seen:
+                    seen.add(child)
+                    next_frontier.append(child)
+        frontier = next_frontier
+    return list(seen)[:n]
+
+
+def _visited_set_bytes(keys):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    visited = set(keys)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del visited
+    return after - before
+
+
+def bench_state_memory(n=20000):
+    """
+    Bytes per visited state: a set of tuple(cube.state) keys (the old
+    canonicalize) vs a set of CubeState keys. Keys are built while tracing.
+    """
+    states = _collect_states(n)
+    raw = [bytes(s) for s in states]
+    tuple_bytes = _visited_set_bytes(tuple(s) for s in raw)
+    compact_bytes = _visited_set_bytes(CubeState(s) for s in raw)
+    return {
+        'states': n,
+        'tuple_bytes_per_state': tuple_bytes / n,
+        'cubestate_bytes_per_state': compact_bytes / n,
+        'reduction': tuple_bytes / compact_bytes,
+    }
+
+
+def _object_level(states):
+    """Expand a frontier one RubiksCube at a time, scoring each child."""
+    scores = []
+    for state in states:
+        for move in MOVES:
+            child = state.to_cube()
+            child.apply_move(move)
+            scores.append(heuristic(child))
+    return scores
+
+
+def _batch_level(batch):
+    """Expand the same frontier as one StateBatch and score it in one pass."""
+    return [m // 8 for m in batch.expand(MOVES).misplaced()]
+
+
+def bench_batch_expand(n=2000, repeat=3):
+    """
+    Level-by-level frontier expansion + heuristic for `n` states: per-object
+    RubiksCube calls vs one StateBatch. Returns seconds for each and the speedup.
+    """
+    states = _collect_states(n)
+    batch = StateBatch.from_states(states)
+    assert _object_level(states) == _batch_level(batch)
+    objects = min(timeit.repeat(lambda: _object_level(states), number=1, repeat=repeat))
+    batched = min(timeit.repeat(lambda: _batch_level(batch), number=1, repeat=repeat))
+    return {
+        'states': n,
+        'children': n * len(MOVES),
+        'object_seconds': objects,
+        'batch_seconds': batched,
+        'speedup': objects / batched,
+    }
+
+
+def _path_list_a_star(start, max_depth, deadline):
+    """The A* loop before array-backed nodes: every heap entry carries its own path list."""
+    open_set = [(heuristic(start), 0, [], start)]
+    visited = {start}
+    popped = 0
+    while open_set and time.time() < deadline:
+        popped += 1
+        f, depth, path, state = heappop(open_set)
+        if state.is_solved():
+            return path, popped
+        if depth >= max_depth:
+            continue
+        children = StateBatch(state).expand(MOVES)
+        scores = children.misplaced()
+        for j, move in enumerate(MOVES):
+            if is_redundant(move, path):
+                continue
+            child = children[j]
+            if child in visited:
+                continue
+            visited.add(child)
+            heappush(open_set, (depth + 1 + scores[j] // 8, depth + 1, path + [move], child))
+    return None, popped
+
+
+def _scramble_state(length, seed):
+    rng = random.Random(seed)
+    state = CubeState.solved()
+    for _ in range(length):
+        state = state.apply(rng.choice(MOVES))
+    return state
+
+
+def _run_search(search, state, max_depth, timeout):
+    start = time.perf_counter()
+    path, nodes = search(state, max_depth, time.time() + timeout)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    search(state, max_depth, time.time() + timeout)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'nodes': nodes, 'nodes_per_sec': nodes / elapsed, 'peak_bytes': peak,
+            'length': None if path is None else len(path)}
+
+
+def bench_search_nodes(length=10, seed=5, max_depth=14, timeout=60):
+    """
+    Peak memory and nodes/sec of the A* core on one seeded scramble (no
+    endgame table): path-list heap entries vs parent-index/move-byte arrays.
+    """
+    state = _scramble_state(length, seed)
+    return {
+        'path_lists': _run_search(_path_list_a_star, state, max_depth, timeout),
+        'node_arrays': _run_search(lambda s, d, t: _a_star_search(s, d, t), state, max_depth, timeout),
+    }
+
+
+# Scramble corpora: `count` scrambles of each length 1..20 (quarter turns), a
+# pure function of (seed, depth), so every run and machine sees the same cubes.
+CORPUS_DEPTHS = range(1, 21)
+SEED = 2025
+
+
+def _anytime(cube, timeout=10):
+    """anytime_solve run to the end (proven optimal or timed out): its last solution."""
+    best = None
+    for update in anytime_solve(cube, timeout=timeout):
+        best = update.moves
+    return best
+
+
+# Every engine timed end to end: the batch engines plus the parallel and anytime front ends
+SOLVERS = dict(ENGINES, parallel_a_star=parallel_a_star_solve, anytime=_anytime)
+# Deepest corpus each engine is run on by default: deeper scrambles take the
+# sticker-level searches far past any sensible timeout.
+ENGINE_DEPTHS = {'a_star': 8, 'bidirectional': 10, 'ida': 12, 'two_phase': 20, 'parallel_a_star': 8,
+                 'anytime': 12}
+# two_phase otherwise keeps shortening its solution until the timeout; time it to a 22-move solution.
+# parallel_a_star gets a fixed pool size, so runs on machines with other core counts compare.
+ENGINE_OPTIONS = {'two_phase': {'target_length': 22}, 'parallel_a_star': {'workers': 2}}
+
+
+def _prepare(engine):
+    """Load the tables `engine` needs before it is timed."""
+    if engine == 'anytime':
+        prepare_engine('two_phase')
+        pattern_database('corners_htm')
+    else:
+        prepare_engine(engine)
+
+
+def corpus(depth, count=10, seed=SEED):
+    """
+    `count` scrambles of exactly `depth` quarter turns with no redundant
+    same-face pairs ("R R'", "R' R'"); the optimal solution can still be
+    shorter. Deterministic in (depth, count, seed).
+    """
+    rng = random.Random(f"{seed}:{depth}")
+    scrambles = []
+    for _ in range(count):
+        scramble = []
+        while len(scramble) < depth:
+            move = rng.choice(MOVES)
+            if not is_redundant(move, scramble):
+                scramble.append(move)
+        scrambles.append(scramble)
+    return scrambles
+
+
+def _scrambled_cube(scramble):
+    cube = RubiksCube()
+    for move in scramble:
+        cube.apply_move(move)
+    return cube
+
+
+def _per_call(func, states, repeat):
+    """Best-of-`repeat` seconds per call of func over `states`."""
+    runs = timeit.repeat(lambda: [func(s) for s in states], number=1, repeat=repeat)
+    return min(runs) / len(states)
+
+
+def bench_micro(depth=20, count=200, repeat=5, seed=SEED):
+    """
+    Nanoseconds per call of the cube-level hot paths, over the seeded
+    corpus at `depth`.
+    """
+    cubes = [_scrambled_cube(s) for s in corpus(depth, count, seed)]
+    states = [CubeState.from_cube(c) for c in cubes]
+    calls = {
+        'copy': (RubiksCube.copy, cubes),
+        'is_solved': (RubiksCube.is_solved, cubes),
+        'heuristic': (heuristic, cubes),
+        'canonicalize': (canonicalize, cubes),
+        'canonicalize_symmetry': (lambda c: canonicalize(c, symmetry=True), cubes),
+        'state_apply': (lambda s: s.apply('R'), states),
+        'state_is_solved': (CubeState.is_solved, states),
+        'batch_expand_misplaced': (lambda s: StateBatch(s).expand(MOVES).misplaced(), states),
+        # Last: it turns the cubes it is timed on
+        'apply_move': (lambda c: c.apply_move('R'), cubes),
+    }
+    return {name: _per_call(func, items, repeat) * 1e9 for name, (func, items) in calls.items()}
+
+
+def bench_solvers(engines=None, depths=None, count=5, timeout=10, seed=SEED):
+    """
+    End-to-end solves of the seeded corpora, per engine and depth (up to
+    ENGINE_DEPTHS[engine] unless `depths` is given), with ENGINE_OPTIONS.
+    Tables are loaded before timing. Each row: solved count, median / max seconds and mean
+    solution length (in the engine's own metric).
+    """
+    results = {}
+    for engine in engines or SOLVERS:
+        _prepare(engine)
+        rows = {}
+        for depth in depths or range(1, ENGINE_DEPTHS[engine] + 1):
+            seconds, lengths = [], []
+            for scramble in corpus(depth, count, seed):
+                cube = _scrambled_cube(scramble)
+                start = time.perf_counter()
+                solution = SOLVERS[engine](cube, timeout=timeout, **ENGINE_OPTIONS.get(engine, {}))
+                seconds.append(time.perf_counter() - start)
+                if solution is not None:
+                    lengths.append(len(solution))
+            rows[depth] = {
+                'scrambles': count,
+                'solved': len(lengths),
+                'median_seconds': statistics.median(seconds),
+                'max_seconds': max(seconds),
+                'mean_length': statistics.fmean(lengths) if lengths else None,
+            }
+        results[engine] = rows
+    return results
+
+
+def environment():
+    """What a result depends on besides the code: interpreter, machine and tables on disk."""
+    tables = {metric: getattr(endgame_table(metric), 'depth', None) for metric in ('qtm', 'htm')}
+    return {
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'endgame_depths': tables,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def run_suite(engines=None, count=5, timeout=10, seed=SEED, micro_count=200, repeat=5):
+    """The full benchmark suite as one JSON-serializable dict."""
+    return {
+        'environment': environment(),
+        'parameters': {'seed': seed, 'count': count, 'timeout': timeout,
+                       'micro_count': micro_count, 'repeat': repeat},
+        'micro_ns': bench_micro(count=micro_count, repeat=repeat, seed=seed),
+        'solvers': bench_solvers(engines, count=count, timeout=timeout, seed=seed),
+    }
+
+
+def _print_comparisons():
+    """Old-vs-new implementation comparisons from earlier optimizations."""
+    result = bench_apply_move()
+    print(f"legacy _face_move : {result['legacy_us_per_node']:.2f} us/node")
+    print(f"compiled perms    : {result['table_us_per_node']:.2f} us/node ({result['speedup']:.1f}x)")
+    print(f"tuple state path  : {result['tuple_us_per_node']:.2f} us/node ({result['tuple_speedup']:.1f}x)")
+    mem = bench_state_memory()
+    print(f"visited set, tuple keys     : {mem['tuple_bytes_per_state']:.0f} bytes/state")
+    print(f"visited set, CubeState keys : {mem['cubestate_bytes_per_state']:.0f} bytes/state "
+          f"({mem['reduction']:.1f}x smaller)")
+    batch = bench_batch_expand()
+    print(f"frontier of {batch['states']} states, per object : {batch['object_seconds'] * 1e3:.1f} ms")
+    print(f"frontier of {batch['states']} states, StateBatch : {batch['batch_seconds'] * 1e3:.1f} ms "
+          f"({batch['speedup']:.1f}x)")
+    search = bench_search_nodes()
+    for name, row in search.items():
+        print(f"A* {name:11s}: {row['nodes']} nodes, {row['nodes_per_sec']:.0f} nodes/s, "
+              f"peak {row['peak_bytes'] / 2 ** 20:.1f} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python benchmark.py',
+                                     description="Seeded, reproducible benchmarks of the cube and solvers.")
+    parser.add_argument('--json', metavar='PATH', help="Write the suite results as JSON ('-' for stdout).")
+    parser.add_argument('--engines', nargs='+', choices=sorted(SOLVERS), default=None,
+                        help="Solver engines to run end to end (default: all).")
+    parser.add_argument('--count', type=int, default=5, help="Scrambles per depth for the solver runs.")
+    parser.add_argument('--timeout', type=float, default=10, help="Seconds per solve.")
+    parser.add_argument('--seed', type=int, default=SEED, help="Corpus seed.")
+    parser.add_argument('--compare', action='store_true',
+                        help="Also print the old-vs-new implementation comparisons.")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        _print_comparisons()
+    suite = run_suite(args.engines, args.count, args.timeout, args.seed)
+    for name, ns in suite['micro_ns'].items():
+        print(f"{name:24s} {ns / 1e3:8.2f} us/call", file=sys.stderr)
+    for engine, rows in suite['solvers'].items():
+        for depth, row in rows.items():
+            length = row['mean_length']
+            print(f"{engine:15s} depth {depth:2d}: {row['solved']}/{row['scrambles']} solved, "
+                  f"median {row['median_seconds']:.3f}s, max {row['max_seconds']:.3f}s, "
+                  f"mean length {length if length is None else f'{length:.1f}'}", file=sys.stderr)
+    if args.json == '-':
+        json.dump(suite, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, 'w') as f:
+            json.dump(suite, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,25 @@
 # cube.py
 
+from functools import lru_cache
+from itertools import permutations, product
+from operator import itemgetter
+
+FACES = 'URFDLB'
+
+# Move sets per metric: quarter-turn metric (QTM) counts a half turn as two
+# moves, half-turn metric (HTM) counts X2 as one.
+QTM_MOVES = ['U', "U'", 'D', "D'", 'F', "F'", 'B', "B'", 'L', "L'", 'R', "R'"]
+HTM_MOVES = ['U', "U'", 'U2', 'D', "D'", 'D2', 'F', "F'", 'F2', 'B', "B'", 'B2', 'L', "L'", 'L2', 'R', "R'", 'R2']
+METRIC_MOVES = {'qtm': QTM_MOVES, 'htm': HTM_MOVES}
+
+
 class RubiksCube:
     """
     3x3x3 Rubik's Cube
     - Each cube has 6 faces: U (0), R (1), F (2), D (3), L (4), B (5)
     - Each face has 9 stickers, so state is a flat list of 54 integers.
+      Stickers are numbered row by row as each face appears in the unfolded
+      net (U above F, L-F-R-B in a row, D below F), i.e. the URFDLB facelet order.
     - Moves: U, D, F, B, L, R and their primes (')
     """
 
@@ -17,54 +32,61 @@ class RubiksCube:
         'B': list(range(45, 54))
     }
 
-    # Mapping of edges per move:
+    # Mapping of edges per move: for a clockwise turn the stickers of
+    # group i-1 move into group i (index-aligned), seen from that face.
     EDGE_MAPS = {
         'U': [
             [36, 37, 38],   # L top
-            [18, 19, 20],   # F top
+            [45, 46, 47],   # B top
             [9, 10, 11],    # R top
-            [45, 46, 47]    # B top
+            [18, 19, 20]    # F top
         ],
         'D': [
             [24, 25, 26],   # F bottom
-            [42, 43, 44],   # L bottom
+            [15, 16, 17],   # R bottom
             [51, 52, 53],   # B bottom
-            [15, 16, 17]    # R bottom
+            [42, 43, 44]    # L bottom
         ],
         'F': [
             [6, 7, 8],      # U bottom row
-            [36, 39, 42],   # L right col (from top to bottom)
-            [27, 28, 29],   # D top row (reversed)
-            [11, 14, 17]    # R left col (from bottom to top)
+            [9, 12, 15],    # R left col (top to bottom)
+            [29, 28, 27],   # D top row (reversed)
+            [44, 41, 38]    # L right col (bottom to top)
         ],
         'B': [
             [2, 1, 0],      # U top row (reversed)
-            [9, 12, 15],    # R right col (top to bottom)
-            [33, 34, 35],   # D bottom row (reversed)
-            [44, 41, 38]    # L left col (bottom to top)
+            [36, 39, 42],   # L left col (top to bottom)
+            [33, 34, 35],   # D bottom row
+            [17, 14, 11]    # R right col (bottom to top)
         ],
         'L': [
             [0, 3, 6],      # U left col (top to bottom)
             [18, 21, 24],   # F left col (top to bottom)
             [27, 30, 33],   # D left col (top to bottom)
-            [45, 48, 51]    # B right col (bottom to top)
+            [53, 50, 47]    # B right col (bottom to top)
         ],
         'R': [
-            [8, 5, 2],      # U right col (top to bottom)
-            [47, 50, 53],   # B left col (bottom to top)
-            [35, 32, 29],   # D right col (top to bottom)
-            [20, 23, 26]    # F right col (top to bottom)
+            [8, 5, 2],      # U right col (bottom to top)
+            [45, 48, 51],   # B left col (top to bottom)
+            [35, 32, 29],   # D right col (bottom to top)
+            [26, 23, 20]    # F right col (bottom to top)
         ]
     }
 
+    # Compiled move permutations (filled in below the class):
+    # move -> 54-tuple `perm` such that new_state[i] = old_state[perm[i]]
+    MOVE_PERMS = {}
+
     def __init__(self, state=None):
         if state:
-            self.state = state[:]
+            self.state = list(state)
         else:
             self.state = [i // 9 for i in range(54)]
 
     def copy(self):
-        return RubiksCube(self.state[:])
+        cube = RubiksCube.__new__(RubiksCube)
+        cube.state = self.state[:]
+        return cube
 
     def is_solved(self):
         return all(self.state[i*9:(i+1)*9].count(self.state[i*9]) == 9 for i in range(6))
@@ -72,17 +94,18 @@ class RubiksCube:
     def apply_move(self, move):
         """
         Apply a move. move: one of 'U','U\'','D','D\'','F','F\'','B','B\'','L','L\'','R','R\''
+        or a half turn 'U2','D2','F2','B2','L2','R2'.
+        Uses the precompiled permutation, so the whole move is a single pass.
         """
-        if len(move) == 1:
-            self._face_move(move, prime=False)
-        elif move[1] == "'":
-            self._face_move(move[0], prime=True)
-        else:
-            raise ValueError("Unsupported move notation.")
+        try:
+            self.state = list(MOVE_GETTERS[move](self.state))
+        except KeyError:
+            raise ValueError("Unsupported move notation.") from None
 
     def _face_move(self, face, prime=False):
         """
         Rotate a face (clockwise by default; counter-clockwise if prime).
+        Reference sticker-by-sticker implementation, only used to compile MOVE_PERMS.
         """
         # 1. Rotate the face's own stickers
         self._rotate_face(self.FACE_INDICES[face], ccw=prime)
@@ -144,3 +167,295 @@ class RubiksCube:
             "    " + ' '.join(color[self.state[i]] for i in range(30,33)) + "\n" +
             "    " + ' '.join(color[self.state[i]] for i in range(33,36)) + "\n"
         )
+
+
+def _compile_moves():
+    """Compile every quarter and half turn into one 54-entry permutation."""
+    perms = {}
+    for face in FACES:
+        for suffix, turns in (('', [False]), ("'", [True]), ('2', [False, False])):
+            cube = RubiksCube(list(range(54)))
+            for prime in turns:
+                cube._face_move(face, prime=prime)
+            perms[face + suffix] = tuple(cube.state)
+    return perms
+
+
+RubiksCube.MOVE_PERMS = _compile_moves()
+
+# move -> itemgetter over the permutation; calling it on a list/tuple/bytes
+# state returns the moved state as a tuple in one C-level pass.
+MOVE_GETTERS = {move: itemgetter(*perm) for move, perm in RubiksCube.MOVE_PERMS.items()}
+
+
+# Outward normal of each face, then the directions of increasing column and
+# row as the face appears in the net (x points to R, y to U, z to F).
+_FACE_FRAMES = {
+    'U': ((0, 1, 0), (1, 0, 0), (0, 0, 1)),
+    'R': ((1, 0, 0), (0, 0, -1), (0, -1, 0)),
+    'F': ((0, 0, 1), (1, 0, 0), (0, -1, 0)),
+    'D': ((0, -1, 0), (1, 0, 0), (0, 0, -1)),
+    'L': ((-1, 0, 0), (0, 0, 1), (0, -1, 0)),
+    'B': ((0, 0, -1), (-1, 0, 0), (0, -1, 0)),
+}
+
+
+def _sticker_geometry():
+    """(position, normal) of every sticker, positions in -1..1 on each axis."""
+    geometry = []
+    for face in FACES:
+        normal, right, down = _FACE_FRAMES[face]
+        for row in range(3):
+            for col in range(3):
+                pos = tuple(normal[k] + right[k] * (col - 1) + down[k] * (row - 1) for k in range(3))
+                geometry.append((pos, normal))
+    return geometry
+
+
+def _compile_symmetries():
+    """
+    The 48 symmetries of the cube (24 rotations, with and without a mirror).
+    Each is (getter, colours): conjugating a state is
+    bytes(getter(state)).translate(colours), i.e. turn the whole cube and
+    recolour it so the centres are back in place. Conjugation keeps the
+    distance to solved. The 16 symmetries that keep the U-D axis come first,
+    starting with the identity.
+    """
+    geometry = _sticker_geometry()
+    index = {g: i for i, g in enumerate(geometry)}
+    keeps_ud, others = [], []
+    for axes in permutations(range(3)):
+        for signs in product((1, -1), repeat=3):
+            def transform(v):
+                return tuple(signs[k] * v[axes[k]] for k in range(3))
+            source = [0] * 54
+            for i, (pos, normal) in enumerate(geometry):
+                source[index[(transform(pos), transform(normal))]] = i
+            target_face = [source.index(9 * f + 4) // 9 for f in range(6)]
+            colours = bytes(target_face) + bytes(range(6, 256))
+            (keeps_ud if axes[1] == 1 else others).append((itemgetter(*source), colours))
+    return keeps_ud + others
+
+
+SYMMETRIES = _compile_symmetries()
+N_UD_SYMMETRIES = 16
+
+
+def conjugate_state(state, sym):
+    """Sticker state conjugated by symmetry number `sym` (see SYMMETRIES), as bytes."""
+    getter, colours = SYMMETRIES[sym]
+    return bytes(getter(state)).translate(colours)
+
+
+def _compile_symmetry_tables():
+    """
+    SYM_MULT[t][s]: symmetry equal to conjugating by s, then by t.
+    SYM_MOVES[s][move]: the move M' with conj_s(X * move) == conj_s(X) * M'.
+    """
+    probe = SOLVED_STATE
+    for move in ['U', 'R2', "F'", 'L', 'D', "B'", 'U2', 'R']:  # a state with no symmetry
+        probe = probe.apply(move)
+    conjugates = {conjugate_state(probe, s): s for s in range(len(SYMMETRIES))}
+    mult = [[conjugates[conjugate_state(conjugate_state(probe, s), t)] for s in range(len(SYMMETRIES))]
+            for t in range(len(SYMMETRIES))]
+    single = {SOLVED_STATE.apply(move): move for move in MOVE_GETTERS}
+    moves = [{move: single[conjugate_state(SOLVED_STATE.apply(move), s)] for move in MOVE_GETTERS}
+             for s in range(len(SYMMETRIES))]
+    return mult, moves
+
+
+def inverse_move(move):
+    """Inverse of a move: X <-> X', X2 is its own inverse."""
+    if move.endswith('2'):
+        return move
+    return move[0] if move.endswith("'") else move + "'"
+
+
+def apply_move_to_state(state, move):
+    """Return `state` (list, tuple or bytes of 54 stickers) after `move`, as a tuple."""
+    return MOVE_GETTERS[move](state)
+
+
+def parse_moves(text):
+    """
+    Split move notation ("R U2 F' B2'") into a list of moves, checked by
+    lookup instead of being applied. X2' is read as X2.
+    Raises ValueError on unknown notation.
+    """
+    moves = text.split()
+    for i, move in enumerate(moves):
+        if move not in MOVE_GETTERS:
+            if move.endswith("2'") and move[:-1] in MOVE_GETTERS:
+                moves[i] = move[:-1]
+            else:
+                raise ValueError(f"Unsupported move notation: {move!r}.")
+    return moves
+
+
+class CubeState(bytes):
+    """
+    Compact, immutable cube state for search nodes: the 54 sticker colours
+    packed into one bytes object (~100 bytes vs ~470 for a tuple of ints).
+    Hashing and comparison run at C speed, so a CubeState is used directly
+    as the `visited` set key and heap payload.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_cube(cls, cube):
+        return cls(cube.state)
+
+    @classmethod
+    def solved(cls):
+        return SOLVED_STATE
+
+    def apply(self, move):
+        """Return a new CubeState with `move` applied (one-pass permutation)."""
+        return CubeState(MOVE_GETTERS[move](self))
+
+    def apply_moves(self, moves):
+        """Return a new CubeState after a sequence of moves, with no intermediate objects."""
+        state = self
+        for move in moves:
+            state = MOVE_GETTERS[move](state)
+        return CubeState(state)
+
+    def is_solved(self):
+        return all(self[i:i + 9] == self[i + 4:i + 5] * 9 for i in range(0, 54, 9))
+
+    def to_cube(self):
+        return RubiksCube(self)
+
+    def canonical(self):
+        """
+        Symmetry-reduced representative: the smallest of the 48 conjugates.
+        All states in one symmetry class share it (and their distance to solved).
+        """
+        return CubeState(min(bytes(getter(self)).translate(colours) for getter, colours in SYMMETRIES))
+
+    def canonical_with_symmetry(self):
+        """(representative, sym) with representative == conjugate_state(self, sym)."""
+        conjugates = [bytes(getter(self)).translate(colours) for getter, colours in SYMMETRIES]
+        rep = min(conjugates)
+        return CubeState(rep), conjugates.index(rep)
+
+
+SOLVED_STATE = CubeState(i // 9 for i in range(54))
+
+SYM_MULT, SYM_MOVES = _compile_symmetry_tables()
+
+_FACELET_LETTERS = bytes.maketrans(bytes(range(6)), FACES.encode())
+
+
+def parse_facelets(text):
+    """
+    CubeState from a 54-sticker facelet string in URFDLB order (the standard
+    layout, e.g. 'UUUUUUUUURRRRRRRRRFFF...'). Any six symbols work: each
+    face's centre names its colour. Whitespace is ignored. Raises ValueError
+    for a malformed string; cubie.verify_state checks it is solvable.
+    """
+    text = ''.join(text.split())
+    if len(text) != 54:
+        raise ValueError(f"A facelet string has 54 stickers, got {len(text)}.")
+    centres = text[4::9]
+    if len(set(centres)) != 6:
+        raise ValueError("The six centre stickers must all differ.")
+    try:
+        state = text.translate({ord(c): i for i, c in enumerate(centres)}).encode('latin-1')
+    except UnicodeEncodeError:
+        state = b'\xff'
+    if max(state) > 5:
+        raise ValueError(f"Facelet symbols must be the centre symbols {centres!r}.")
+    return CubeState(state)
+
+
+def format_facelets(state):
+    """URFDLB facelet string of a CubeState, RubiksCube.state or other 54-sticker sequence."""
+    return bytes(state).translate(_FACELET_LETTERS).decode('latin-1')
+
+
+# States per chunk in StateBatch: one tiled itemgetter permutes a whole chunk.
+# Shorter batches (up to _EXACT_ROWS states, e.g. one search node) get a getter
+# of their own size; longer tails are padded to a full chunk.
+BATCH_ROWS = 256
+_EXACT_ROWS = 16
+
+
+@lru_cache(maxsize=None)
+def _batch_getter(moves, rows):
+    """
+    One itemgetter over a `rows` x 54 buffer that yields, row-major, every
+    row after each of `moves` (rows * len(moves) output states).
+    """
+    perms = [RubiksCube.MOVE_PERMS[move] for move in moves]
+    return itemgetter(*[54 * row + p for row in range(rows) for perm in perms for p in perm])
+
+
+class StateBatch:
+    """
+    Many cube states in one flat bytes buffer (N x 54 stickers, row-major).
+    Moves permute whole chunks of states in one C-level itemgetter call and
+    misplaced-sticker counts for all rows come from one XOR against the
+    solved state, instead of one Python call per RubiksCube.
+    """
+    __slots__ = ('data',)
+
+    def __init__(self, data=b''):
+        self.data = bytes(data)
+
+    @classmethod
+    def from_states(cls, states):
+        return cls(b''.join(states))
+
+    def __len__(self):
+        return len(self.data) // 54
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        return CubeState(self.data[54 * i:54 * i + 54])
+
+    def __iter__(self):
+        data = self.data
+        return (CubeState(data[i:i + 54]) for i in range(0, len(data), 54))
+
+    def expand(self, moves):
+        """
+        Batch of len(self) * len(moves) children: row i * len(moves) + j is
+        state i after moves[j].
+        """
+        moves = tuple(moves)
+        data = self.data
+        chunk = 54 * BATCH_ROWS
+        out = []
+        for start in range(0, len(data), chunk):
+            block = data[start:start + chunk]
+            rows = len(block) // 54
+            if rows == BATCH_ROWS or rows <= _EXACT_ROWS:
+                out.append(bytes(_batch_getter(moves, rows)(block)))
+            else:
+                # Pad a long tail with solved states so the cached full-chunk getter fits
+                padded = block + SOLVED_STATE * (BATCH_ROWS - rows)
+                out.append(bytes(_batch_getter(moves, BATCH_ROWS)(padded))[:54 * rows * len(moves)])
+        return StateBatch(b''.join(out))
+
+    def apply(self, move):
+        """Every state after the same move."""
+        return self.expand((move,))
+
+    def misplaced(self):
+        """Number of stickers not on their solved face, for every state."""
+        n = len(self)
+        if not n:
+            return []
+        diff = (int.from_bytes(self.data, 'big') ^ _solved_int(n)).to_bytes(54 * n, 'big')
+        return [54 - diff.count(0, i, i + 54) for i in range(0, 54 * n, 54)]
+
+    def solved_mask(self):
+        """True for every state that is solved."""
+        return [count == 0 for count in self.misplaced()]
+
+
+@lru_cache(maxsize=8)
+def _solved_int(n):
+    return int.from_bytes(SOLVED_STATE * n, 'big')
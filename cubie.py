@@ -0,0 +1,502 @@
+# cubie.py
+
+from array import array
+from itertools import combinations, permutations
+from operator import itemgetter
+from cube import RubiksCube, FACES, N_UD_SYMMETRIES, conjugate_state
+
+# Corner and edge slots, numbered as in Kociemba's two-phase algorithm.
+CORNERS = ['URF', 'UFL', 'ULB', 'UBR', 'DFR', 'DLF', 'DBL', 'DRB']
+EDGES = ['UR', 'UF', 'UL', 'UB', 'DR', 'DF', 'DL', 'DB', 'FR', 'FL', 'BL', 'BR']
+
+# Edge groups tracked by the sorted-slice style coordinates
+U_EDGES = (0, 1, 2, 3)
+D_EDGES = (4, 5, 6, 7)
+SLICE_EDGES = (8, 9, 10, 11)
+
+# Sticker indices of every corner/edge slot. The first sticker of a corner
+# is its U/D sticker, the others follow clockwise; the first sticker of an
+# edge is its U/D sticker (F/B sticker for the four UD-slice edges).
+CORNER_FACELETS = [
+    [8, 9, 20], [6, 18, 38], [0, 36, 47], [2, 45, 11],
+    [29, 26, 15], [27, 44, 24], [33, 53, 42], [35, 17, 51],
+]
+EDGE_FACELETS = [
+    [5, 10], [7, 19], [3, 37], [1, 46], [32, 16], [28, 25],
+    [30, 43], [34, 52], [23, 12], [21, 41], [50, 39], [48, 14],
+]
+# Colours of each cubie in its home slot (sticker colour == face index)
+CORNER_COLORS = [[i // 9 for i in slot] for slot in CORNER_FACELETS]
+EDGE_COLORS = [[i // 9 for i in slot] for slot in EDGE_FACELETS]
+
+# Sticker colours read from a slot -> (cubie, orientation) for every cubie in
+# every orientation, so facelets convert with one lookup per slot
+_CORNER_GETTERS = [itemgetter(*slot) for slot in CORNER_FACELETS]
+_EDGE_GETTERS = [itemgetter(*slot) for slot in EDGE_FACELETS]
+_CORNER_LOOKUP = {tuple(colors[(k - ori) % 3] for k in range(3)): (j, ori)
+                  for j, colors in enumerate(CORNER_COLORS) for ori in range(3)}
+_EDGE_LOOKUP = {tuple(colors[(k - ori) % 2] for k in range(2)): (j, ori)
+                for j, colors in enumerate(EDGE_COLORS) for ori in range(2)}
+_CORNER_SET = list(range(8))
+_EDGE_SET = list(range(12))
+
+# Coordinate ranges
+N_TWIST = 2187          # 3^7 corner orientations
+N_FLIP = 2048           # 2^11 edge orientations
+N_SLICE = 495           # C(12, 4) positions of the UD-slice edges
+N_SLICE_CLASSES = 45    # classes of the slice coordinate under the 16 UD-axis symmetries
+N_SLICE_SORTED = 11880  # 12*11*10*9 positions of the ordered UD-slice edges
+N_CORNERS = 40320       # 8! corner permutations
+N_UD_EDGES = 40320      # 8! U/D edge permutations (phase 2 only)
+N_EDGES = 479001600     # 12! edge permutations (rank only, no move table)
+
+# The 18 face turns in table order: U, U2, U', R, R2, R', ...
+MOVE_NAMES = [face + suffix for face in FACES for suffix in ('', '2', "'")]
+N_MOVE = len(MOVE_NAMES)
+MOVE_INDEX = {name: i for i, name in enumerate(MOVE_NAMES)}
+# Moves that keep the cube in the subgroup G1 = <U, D, R2, F2, L2, B2>
+PHASE2_MOVES = [MOVE_INDEX[m] for m in ['U', 'U2', "U'", 'R2', 'F2', 'D', 'D2', "D'", 'L2', 'B2']]
+
+# Marks move-table entries that are undefined (ud_edges under a non-G1 move)
+UNDEFINED = 0xFFFF
+
+# 4-subsets of the 12 edge slots holding the slice edges; (8, 9, 10, 11) is index 0
+_SLICE_SETS = [tuple(sorted(11 - p for p in c)) for c in combinations(range(12), 4)]
+_SLICE_SET_INDEX = {s: i for i, s in enumerate(_SLICE_SETS)}
+_PERM4 = list(permutations(range(4)))
+_PERM4_INDEX = {p: i for i, p in enumerate(_PERM4)}
+
+
+def _perm_rank(perm):
+    """Lexicographic rank of a permutation of range(n)."""
+    n = len(perm)
+    rank = 0
+    for i in range(n):
+        smaller = sum(1 for j in range(i + 1, n) if perm[j] < perm[i])
+        rank = rank * (n - i) + smaller
+    return rank
+
+
+def _perm_unrank(rank, n):
+    """Inverse of _perm_rank."""
+    digits = []
+    for base in range(1, n + 1):
+        digits.append(rank % base)
+        rank //= base
+    items = list(range(n))
+    return [items.pop(d) for d in reversed(digits)]
+
+
+class CubieCube:
+    """
+    Cube on the cubie level:
+    - cp[i]: corner in slot i, co[i]: its twist (0..2)
+    - ep[i]: edge in slot i, eo[i]: its flip (0..1)
+    Products follow Kociemba: (a * b) means "a, then b".
+    """
+    __slots__ = ('cp', 'co', 'ep', 'eo')
+
+    def __init__(self, cp=None, co=None, ep=None, eo=None):
+        self.cp = list(cp) if cp is not None else list(range(8))
+        self.co = list(co) if co is not None else [0] * 8
+        self.ep = list(ep) if ep is not None else list(range(12))
+        self.eo = list(eo) if eo is not None else [0] * 12
+
+    def copy(self):
+        return CubieCube(self.cp, self.co, self.ep, self.eo)
+
+    def __eq__(self, other):
+        return (isinstance(other, CubieCube) and self.cp == other.cp and self.co == other.co
+                and self.ep == other.ep and self.eo == other.eo)
+
+    def __repr__(self):
+        return f"CubieCube(cp={self.cp}, co={self.co}, ep={self.ep}, eo={self.eo})"
+
+    def is_solved(self):
+        return self == SOLVED_CUBIE
+
+    # --- facelet conversion -------------------------------------------------
+
+    @classmethod
+    def from_facelets(cls, state):
+        """
+        Build a CubieCube from 54 sticker colours (RubiksCube.state / CubeState).
+        Raises ValueError if a corner or edge has an impossible colour combination.
+        """
+        cube = cls.__new__(cls)
+        cube.cp, cube.co, cube.ep, cube.eo = [0] * 8, [0] * 8, [0] * 12, [0] * 12
+        for i, getter in enumerate(_CORNER_GETTERS):
+            colors = getter(state)
+            try:
+                cube.cp[i], cube.co[i] = _CORNER_LOOKUP[colors]
+            except KeyError:
+                problem = "an invalid colour combination" if 0 in colors or 3 in colors else "no U/D sticker"
+                raise ValueError(f"Corner {CORNERS[i]} has {problem}.") from None
+        for i, getter in enumerate(_EDGE_GETTERS):
+            try:
+                cube.ep[i], cube.eo[i] = _EDGE_LOOKUP[getter(state)]
+            except KeyError:
+                raise ValueError(f"Edge {EDGES[i]} has an invalid colour combination.") from None
+        return cube
+
+    def verify(self):
+        """
+        Raise ValueError unless this is a reachable cube: every corner and
+        edge exactly once, twists summing to 0 mod 3, flips to 0 mod 2 and
+        equal corner and edge permutation parity.
+        """
+        if sorted(self.cp) != _CORNER_SET:
+            raise ValueError("Some corner appears twice (and another is missing).")
+        if sorted(self.ep) != _EDGE_SET:
+            raise ValueError("Some edge appears twice (and another is missing).")
+        if sum(self.co) % 3:
+            raise ValueError("A corner is twisted (corner twists do not sum to 0 mod 3).")
+        if sum(self.eo) % 2:
+            raise ValueError("An edge is flipped (edge flips do not sum to 0 mod 2).")
+        if self.corner_parity() != self.edge_parity():
+            raise ValueError("Parity error: two pieces are swapped.")
+
+    def to_facelets(self):
+        """Return the 54 sticker colours as a list (RubiksCube.state layout)."""
+        state = [i // 9 for i in range(54)]
+        for i, slot in enumerate(CORNER_FACELETS):
+            colors, ori = CORNER_COLORS[self.cp[i]], self.co[i]
+            for k in range(3):
+                state[slot[(k + ori) % 3]] = colors[k]
+        for i, slot in enumerate(EDGE_FACELETS):
+            colors, ori = EDGE_COLORS[self.ep[i]], self.eo[i]
+            for k in range(2):
+                state[slot[(k + ori) % 2]] = colors[k]
+        return state
+
+    @classmethod
+    def from_cube(cls, cube):
+        return cls.from_facelets(cube.state)
+
+    def to_cube(self):
+        return RubiksCube(self.to_facelets())
+
+    # --- group operations ---------------------------------------------------
+
+    def corner_multiply(self, b):
+        """self = self * b on the corners."""
+        self.cp, self.co = (
+            [self.cp[b.cp[c]] for c in range(8)],
+            [(self.co[b.cp[c]] + b.co[c]) % 3 for c in range(8)],
+        )
+
+    def edge_multiply(self, b):
+        """self = self * b on the edges."""
+        self.ep, self.eo = (
+            [self.ep[b.ep[e]] for e in range(12)],
+            [(self.eo[b.ep[e]] + b.eo[e]) % 2 for e in range(12)],
+        )
+
+    def multiply(self, b):
+        self.corner_multiply(b)
+        self.edge_multiply(b)
+
+    def inverse(self):
+        inv = CubieCube()
+        for i in range(8):
+            inv.cp[self.cp[i]] = i
+        for i in range(8):
+            inv.co[i] = (3 - self.co[inv.cp[i]]) % 3
+        for i in range(12):
+            inv.ep[self.ep[i]] = i
+        for i in range(12):
+            inv.eo[i] = self.eo[inv.ep[i]]
+        return inv
+
+    def conjugate(self, sym):
+        """This cube conjugated by symmetry `sym` (numbered as cube.SYMMETRIES)."""
+        return CubieCube.from_facelets(conjugate_state(self.to_facelets(), sym))
+
+    def apply_move(self, move):
+        """Apply a move by name ('U', "U'", 'U2', ...)."""
+        try:
+            self.multiply(MOVE_CUBES[MOVE_INDEX[move]])
+        except KeyError:
+            raise ValueError("Unsupported move notation.") from None
+
+    # --- coordinates --------------------------------------------------------
+
+    def get_twist(self):
+        """Corner orientation coordinate, 0..2186 (0 when all corners are oriented)."""
+        twist = 0
+        for i in range(7):
+            twist = 3 * twist + self.co[i]
+        return twist
+
+    def set_twist(self, twist):
+        total = 0
+        for i in range(6, -1, -1):
+            self.co[i] = twist % 3
+            total += self.co[i]
+            twist //= 3
+        self.co[7] = -total % 3
+
+    def get_flip(self):
+        """Edge orientation coordinate, 0..2047."""
+        flip = 0
+        for i in range(11):
+            flip = 2 * flip + self.eo[i]
+        return flip
+
+    def set_flip(self, flip):
+        total = 0
+        for i in range(10, -1, -1):
+            self.eo[i] = flip % 2
+            total += self.eo[i]
+            flip //= 2
+        self.eo[11] = total % 2
+
+    def get_edge_group(self, group):
+        """
+        Positions and order of four edges (group: 4 edge ids, ascending), 0..11879:
+        index of the slot set * 24 + rank of their order. Any group shares the
+        'slice_sorted' move table, which only tracks where the four edges go.
+        """
+        positions = tuple(p for p in range(12) if self.ep[p] in group)
+        order = tuple(group.index(self.ep[p]) for p in positions)
+        return _SLICE_SET_INDEX[positions] * 24 + _PERM4_INDEX[order]
+
+    def get_slice_sorted(self):
+        """
+        Positions and order of the four UD-slice edges FR, FL, BL, BR, 0..11879:
+        slice * 24 + rank of their order. 0 when they are home.
+        """
+        return self.get_edge_group(SLICE_EDGES)
+
+    def set_slice_sorted(self, idx):
+        positions = _SLICE_SETS[idx // 24]
+        order = _PERM4[idx % 24]
+        others = iter(range(8))
+        for p in range(12):
+            self.ep[p] = -1
+        for p, e in zip(positions, order):
+            self.ep[p] = e + 8
+        for p in range(12):
+            if self.ep[p] == -1:
+                self.ep[p] = next(others)
+
+    def get_slice(self):
+        """UD-slice coordinate: which 4 slots hold the slice edges, 0..494."""
+        return self.get_slice_sorted() // 24
+
+    def set_slice(self, idx):
+        self.set_slice_sorted(idx * 24)
+
+    def get_corners(self):
+        """Corner permutation rank, 0..40319."""
+        return _perm_rank(self.cp)
+
+    def set_corners(self, idx):
+        self.cp = _perm_unrank(idx, 8)
+
+    def get_edges(self):
+        """Edge permutation rank, 0..479001599."""
+        return _perm_rank(self.ep)
+
+    def set_edges(self, idx):
+        self.ep = _perm_unrank(idx, 12)
+
+    def get_ud_edges(self):
+        """Permutation rank of the 8 U/D edges, 0..40319. Only defined in G1 (slice edges in the slice)."""
+        return _perm_rank(self.ep[:8])
+
+    def set_ud_edges(self, idx):
+        self.ep = _perm_unrank(idx, 8) + [8, 9, 10, 11]
+
+    def corner_parity(self):
+        return sum(1 for i in range(8) for j in range(i) if self.cp[j] > self.cp[i]) % 2
+
+    def edge_parity(self):
+        return sum(1 for i in range(12) for j in range(i) if self.ep[j] > self.ep[i]) % 2
+
+
+SOLVED_CUBIE = CubieCube()
+
+_CENTRES = bytes(range(6))
+
+
+def verify_state(state):
+    """
+    Check that 54 sticker colours (RubiksCube.state, CubeState, list) are a
+    solvable cube, in microseconds: centres in place, nine stickers of each
+    colour, valid cubies, each exactly once, and the twist, flip and parity
+    invariants. Returns the CubieCube; raises ValueError naming the problem.
+    """
+    if len(state) != 54:
+        raise ValueError(f"A cube has 54 stickers, got {len(state)}.")
+    try:
+        data = bytes(state)
+    except (TypeError, ValueError):
+        raise ValueError("Sticker colours must be integers 0..5.") from None
+    if data[4::9] != _CENTRES:
+        raise ValueError("Centre stickers must be the face colours 0..5 in URFDLB order.")
+    if any(data.count(colour) != 9 for colour in _CENTRES):
+        raise ValueError("Every colour must appear on exactly nine stickers.")
+    cube = CubieCube.from_facelets(data)
+    cube.verify()
+    return cube
+
+
+def merge_ud_edges(u_edges, d_edges):
+    """ud_edges coordinate of a G1 cube from its U_EDGES and D_EDGES group coordinates."""
+    ep = [0] * 8
+    for value, group in ((u_edges, U_EDGES), (d_edges, D_EDGES)):
+        for p, k in zip(_SLICE_SETS[value // 24], _PERM4[value % 24]):
+            ep[p] = group[k]
+    return _perm_rank(ep)
+
+
+def _basic_move_cubes():
+    """Derive the cubie-level face turns from the sticker permutations in cube.py."""
+    cubes = []
+    for name in MOVE_NAMES:
+        cube = RubiksCube()
+        cube.apply_move(name)
+        cubes.append(CubieCube.from_facelets(cube.state))
+    return cubes
+
+
+# Cubie-level effect of each of the 18 moves, in MOVE_NAMES order
+MOVE_CUBES = _basic_move_cubes()
+
+
+# --- move tables ------------------------------------------------------------
+
+def _orientation_table(size, setter, getter, multiply):
+    table = array('H', bytes(2 * size * N_MOVE))
+    cube = CubieCube()
+    for i in range(size):
+        setter(cube, i)
+        for m, move in enumerate(MOVE_CUBES):
+            moved = cube.copy()
+            multiply(moved, move)
+            table[N_MOVE * i + m] = getter(moved)
+    return table
+
+
+def _permutation_table(n, move_perms):
+    """Move table over the lexicographic ranks of permutations of range(n)."""
+    perms = list(permutations(range(n)))
+    index = {p: i for i, p in enumerate(perms)}
+    getters = [itemgetter(*perm) if perm is not None else None for perm in move_perms]
+    table = array('H', [UNDEFINED]) * (len(perms) * N_MOVE)
+    for i, perm in enumerate(perms):
+        base = N_MOVE * i
+        for m, getter in enumerate(getters):
+            if getter is not None:
+                table[base + m] = index[getter(perm)]
+    return table
+
+
+def _slice_sorted_table():
+    table = array('H', bytes(2 * N_SLICE_SORTED * N_MOVE))
+    # dest[m][q]: slot that the edge in slot q moves to under move m
+    dest = [[move.ep.index(q) for q in range(12)] for move in MOVE_CUBES]
+    for idx in range(N_SLICE_SORTED):
+        positions, order = _SLICE_SETS[idx // 24], _PERM4[idx % 24]
+        pos = [0] * 4
+        for p, e in zip(positions, order):
+            pos[e] = p
+        for m in range(N_MOVE):
+            new = [dest[m][p] for p in pos]
+            new_order = tuple(sorted(range(4), key=new.__getitem__))
+            new_positions = tuple(sorted(new))
+            table[N_MOVE * idx + m] = _SLICE_SET_INDEX[new_positions] * 24 + _PERM4_INDEX[new_order]
+    return table
+
+
+def _slice_table():
+    sorted_table = move_table('slice_sorted')
+    table = array('H', bytes(2 * N_SLICE * N_MOVE))
+    for idx in range(N_SLICE):
+        for m in range(N_MOVE):
+            table[N_MOVE * idx + m] = sorted_table[N_MOVE * idx * 24 + m] // 24
+    return table
+
+
+_TABLE_BUILDERS = {
+    'twist': lambda: _orientation_table(N_TWIST, CubieCube.set_twist, CubieCube.get_twist,
+                                        CubieCube.corner_multiply),
+    'flip': lambda: _orientation_table(N_FLIP, CubieCube.set_flip, CubieCube.get_flip,
+                                       CubieCube.edge_multiply),
+    'slice_sorted': _slice_sorted_table,
+    'slice': _slice_table,
+    'corners': lambda: _permutation_table(8, [move.cp for move in MOVE_CUBES]),
+    'ud_edges': lambda: _permutation_table(
+        8, [MOVE_CUBES[m].ep[:8] if m in PHASE2_MOVES else None for m in range(N_MOVE)]),
+}
+_MOVE_TABLES = {}
+
+
+def move_table(coord):
+    """
+    Precomputed move table for a coordinate, built on first use:
+    table[N_MOVE * value + move_index] is the coordinate after the move.
+    coord: 'twist', 'flip', 'slice', 'slice_sorted', 'corners' or 'ud_edges'
+    ('ud_edges' is only defined for PHASE2_MOVES, other entries are UNDEFINED).
+    """
+    table = _MOVE_TABLES.get(coord)
+    if table is None:
+        table = _MOVE_TABLES[coord] = _TABLE_BUILDERS[coord]()
+    return table
+
+
+# --- symmetry tables ----------------------------------------------------------
+
+def _twist_conj_table():
+    table = array('H', bytes(2 * N_TWIST * N_UD_SYMMETRIES))
+    cube = CubieCube()
+    for twist in range(N_TWIST):
+        cube.set_twist(twist)
+        for sym in range(N_UD_SYMMETRIES):
+            table[N_UD_SYMMETRIES * twist + sym] = cube.conjugate(sym).get_twist()
+    return table
+
+
+def _slice_classes():
+    class_of = array('H', bytes(2 * N_SLICE))
+    sym_of = array('B', bytes(N_SLICE))
+    reps = []
+    cube = CubieCube()
+    for slc in range(N_SLICE):
+        cube.set_slice(slc)
+        conjugates = [cube.conjugate(sym).get_slice() for sym in range(N_UD_SYMMETRIES)]
+        rep = min(conjugates)
+        if rep == slc:
+            reps.append(slc)
+        sym_of[slc] = conjugates.index(rep)
+        class_of[slc] = rep  # replaced by the class number below
+    assert len(reps) == N_SLICE_CLASSES
+    numbers = {rep: i for i, rep in enumerate(reps)}
+    for slc in range(N_SLICE):
+        class_of[slc] = numbers[class_of[slc]]
+    return class_of, sym_of, reps
+
+
+_SYM_TABLES = {}
+
+
+def twist_conj_table():
+    """
+    twist_conj[N_UD_SYMMETRIES * twist + sym] is the twist of the cube
+    conjugated by UD-axis symmetry `sym` (built on first use).
+    """
+    if 'twist_conj' not in _SYM_TABLES:
+        _SYM_TABLES['twist_conj'] = _twist_conj_table()
+    return _SYM_TABLES['twist_conj']
+
+
+def slice_classes():
+    """
+    Classes of the UD-slice coordinate under the 16 UD-axis symmetries, as
+    (class_of, sym_of, reps): conjugating by sym_of[slice] maps slice to
+    reps[class_of[slice]]. Built on first use.
+    """
+    if 'slice_classes' not in _SYM_TABLES:
+        _SYM_TABLES['slice_classes'] = _slice_classes()
+    return _SYM_TABLES['slice_classes']
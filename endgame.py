@@ -0,0 +1,203 @@
+# endgame.py
+
+import hashlib
+import os
+import struct
+import zlib
+from operator import itemgetter
+from cube import METRIC_MOVES, RubiksCube, SOLVED_STATE, StateBatch, inverse_move
+from pruning import TABLE_DIR, map_table, write_table
+
+# Default depth per metric: every state within this many moves of solved is
+# stored (~1M states, ~25 MB, for either default).
+ENDGAME_DEPTHS = {'qtm': 6, 'htm': 5}
+
+# On-disk layout: header + sorted fixed-size records (24-byte state key, 1-byte
+# index into METRIC_MOVES[metric] of the optimal next move; NO_MOVE for solved).
+ENDGAME_VERSION = 1
+_MAGIC = b'RCET'
+_HEADER = struct.Struct('<4sHB3sI16sI')  # magic, version, depth, metric, entries, fingerprint, crc32
+KEY_SIZE = 24
+RECORD_SIZE = KEY_SIZE + 1
+NO_MOVE = 0xFF
+
+# Centres never move, so a state is keyed by its 48 other stickers, two per byte
+_KEY_GETTER = itemgetter(*[i for i in range(54) if i % 9 != 4])
+_LOW = int.from_bytes(b'\x00\x0f' * KEY_SIZE, 'big')
+_HIGH = int.from_bytes(b'\x00\xf0' * KEY_SIZE, 'big')
+
+
+def encode_state(state):
+    """24-byte table key of a CubeState (or any 54-sticker sequence)."""
+    wide = int.from_bytes(bytes(_KEY_GETTER(state)), 'big')
+    # Merge each pair of sticker bytes (a, b) into the low byte a << 4 | b, then keep the low bytes
+    return (((wide >> 4) & _HIGH) | (wide & _LOW)).to_bytes(2 * KEY_SIZE, 'big')[1::2]
+
+
+def _fingerprint(metric, depth):
+    spec = (ENDGAME_VERSION, metric, depth, sorted(RubiksCube.MOVE_PERMS.items()))
+    return hashlib.sha256(repr(spec).encode()).digest()[:16]
+
+
+def table_path(metric, depth, directory=None):
+    return os.path.join(directory or TABLE_DIR, f"endgame_{metric}_{depth}.cet")
+
+
+def _build_records(metric, depth):
+    """
+    Breadth-first search from solved to `depth`; returns the sorted records.
+    A state first reached by move m is solved next by the inverse of m.
+    """
+    moves = METRIC_MOVES[metric]
+    inverse = [moves.index(inverse_move(move)) for move in moves]
+    next_move = {SOLVED_STATE: NO_MOVE}
+    frontier = StateBatch(SOLVED_STATE)
+    for _ in range(depth):
+        level = []
+        for i, child in enumerate(frontier.expand(moves)):
+            if child not in next_move:
+                next_move[child] = inverse[i % len(moves)]
+                level.append(child)
+        frontier = StateBatch.from_states(level)
+    records = sorted(encode_state(state) + bytes((move,)) for state, move in next_move.items())
+    return b''.join(records)
+
+
+class EndgameTable:
+    """
+    Optimal next move for every state within `depth` moves of solved.
+    Records are sorted by key and found by binary search, straight from the
+    mmap'ed file (records start at `offset`, past the header) or from an
+    in-memory buffer if the table could not be written.
+    """
+    __slots__ = ('metric', 'depth', 'moves', 'size', 'data', 'offset')
+
+    def __init__(self, metric, depth, data, offset=0):
+        self.metric = metric
+        self.depth = depth
+        self.moves = METRIC_MOVES[metric]
+        self.size = (len(data) - offset) // RECORD_SIZE
+        self.data = data
+        self.offset = offset
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, state):
+        return self.next_move(state) is not None
+
+    def next_move(self, state):
+        """Optimal next move for `state`, '' if it is solved, None if it is not in the table."""
+        key = encode_state(state)
+        data = self.data
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = self.offset + mid * RECORD_SIZE
+            probe = data[offset:offset + KEY_SIZE]
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                move = data[offset + KEY_SIZE]
+                return '' if move == NO_MOVE else self.moves[move]
+        return None
+
+    def solve(self, state):
+        """Optimal solution by table walk, or None if `state` is deeper than the table."""
+        path = []
+        move = self.next_move(state)
+        if move is None:
+            return None
+        while move:
+            path.append(move)
+            state = state.apply(move)
+            move = self.next_move(state)
+        return path
+
+
+def build_table(metric='qtm', depth=None, directory=None):
+    """Build the endgame table and write it atomically to disk. Returns the path."""
+    depth = ENDGAME_DEPTHS[metric] if depth is None else depth
+    payload = _build_records(metric, depth)
+    header = _HEADER.pack(_MAGIC, ENDGAME_VERSION, depth, metric.encode(), len(payload) // RECORD_SIZE,
+                          _fingerprint(metric, depth), zlib.crc32(payload))
+    return write_table(table_path(metric, depth, directory), header, payload)
+
+
+def load_table(metric='qtm', depth=None, directory=None):
+    """
+    mmap an endgame table from disk. Returns None if the file is missing,
+    truncated, built for other moves, or fails its checksum.
+    """
+    depth = ENDGAME_DEPTHS[metric] if depth is None else depth
+    mapped = map_table(table_path(metric, depth, directory))
+    if mapped is None:
+        return None
+    if len(mapped) < _HEADER.size:
+        mapped.close()
+        return None
+    magic, version, table_depth, table_metric, entries, fingerprint, crc = _HEADER.unpack_from(mapped)
+    payload = memoryview(mapped)[_HEADER.size:]
+    if (magic != _MAGIC or version != ENDGAME_VERSION or table_depth != depth
+            or table_metric != metric.encode() or len(payload) != entries * RECORD_SIZE
+            or fingerprint != _fingerprint(metric, depth) or zlib.crc32(payload) != crc):
+        payload.release()
+        mapped.close()
+        return None
+    payload.release()
+    return EndgameTable(metric, depth, mapped, _HEADER.size)
+
+
+_TABLES = {}
+
+
+def _depths_on_disk(metric, directory=None):
+    """Depths of the endgame table files present for a metric, deepest first."""
+    prefix, suffix = f"endgame_{metric}_", ".cet"
+    try:
+        names = os.listdir(directory or TABLE_DIR)
+    except OSError:
+        return []
+    depths = [name[len(prefix):-len(suffix)] for name in names if name.startswith(prefix) and name.endswith(suffix)]
+    return sorted((int(d) for d in depths if d.isdigit()), reverse=True)
+
+
+def endgame_table(metric='qtm', depth=None, directory=None, build=False):
+    """
+    Return an endgame table for a metric, mmap'ed from the table directory
+    (with depth=None, the deepest valid one there). Without build=True a
+    missing table gives None, so solvers only use one once
+    `python -m solver build-tables` has written it.
+    """
+    key = (metric, depth, directory or TABLE_DIR)
+    table = _TABLES.get(key)
+    if table is None:
+        for candidate in ([depth] if depth is not None else _depths_on_disk(metric, directory)):
+            table = load_table(metric, candidate, directory)
+            if table is not None:
+                break
+        if table is None and build:
+            depth = ENDGAME_DEPTHS[metric] if depth is None else depth
+            try:
+                build_table(metric, depth, directory)
+                table = load_table(metric, depth, directory)
+            except OSError:
+                table = None
+            if table is None:
+                table = EndgameTable(metric, depth, _build_records(metric, depth))
+        if table is not None:
+            _TABLES[key] = table
+    return table
+
+
+def build_tables(directory=None, depths=None, force=False):
+    """Build the endgame table of each metric if missing or stale. Returns {metric: path}."""
+    depths = depths or ENDGAME_DEPTHS
+    paths = {}
+    for metric, depth in depths.items():
+        if force or load_table(metric, depth, directory) is None:
+            build_table(metric, depth, directory)
+        paths[metric] = table_path(metric, depth, directory)
+    return paths
@@ -2,15 +2,67 @@
 
 import tkinter as tk
 from tkinter import messagebox
-from cube import RubiksCube
-from solver import a_star_solve
+from cube import RubiksCube, CubeState, HTM_MOVES, inverse_move
+from solver import SolutionCache, anytime_solve
+from twophase import prepare_tables
+from endgame import endgame_table
+from optimize import optimize_solution
+from pruning import TABLE_DIR
+import multiprocessing
+import os
+import queue
 import random
 import threading
+import time
 
 # Define colors for each cube face
 COLOR_MAP = ['white', 'red', 'green', 'yellow', 'orange', 'blue']
 
-MOVE_LIST = ['U', "U'", 'D', "D'", 'F', "F'", 'B', "B'", 'L', "L'", 'R', "R'"]
+MOVE_LIST = HTM_MOVES
+
+# Milliseconds between polls of the solver queue / between animated moves
+POLL_MS = 50
+ANIMATION_MS = 180
+# Seconds between progress messages from the solver process
+PROGRESS_INTERVAL = 0.25
+SOLVE_TIMEOUT = 3
+
+
+def _prepare_solver():
+    """
+    Load every table anytime_solve uses (~1 s, longer if the pattern
+    databases must be built). Done once in the GUI process, on a background
+    thread, so each forked solver starts searching at once.
+    """
+    prepare_tables()
+    endgame_table('htm')
+
+
+def _solve_worker(state, timeout, out):
+    """
+    Solver process: run anytime_solve on `state` (bytes) and stream
+    ('progress', nodes, nodes_per_sec), ('update', moves, seconds, nodes, optimal),
+    ('error', message) and finally ('done',) messages to the `out` queue.
+    """
+    last = [None, 0]  # time and node count of the last progress message
+
+    def progress(nodes):
+        now = time.time()
+        if last[0] is None:
+            last[:] = now, nodes
+        elif now - last[0] >= PROGRESS_INTERVAL:
+            # Rate over the last interval (the count restarts when the optimality proof begins)
+            rate = max(nodes - last[1], 0) / (now - last[0])
+            last[:] = now, nodes
+            out.put(('progress', nodes, rate))
+
+    try:
+        for update in anytime_solve(CubeState(state).to_cube(), timeout=timeout, progress=progress):
+            out.put(('update', update.moves, update.elapsed, update.nodes, update.optimal))
+    except ValueError as exc:
+        out.put(('error', str(exc)))
+    out.put(('done',))
+
 
 class CubeGUI(tk.Tk):
     def __init__(self):
@@ -20,8 +72,32 @@ class CubeGUI(tk.Tk):
         self.cube = RubiksCube()
         self.scramble_sequence = []
         self.solution_sequence = []
+        # Solutions of positions seen before (or symmetric to them), kept across sessions
+        self.cache = SolutionCache(path=os.path.join(TABLE_DIR, 'solutions.json'))
+        # Running solve (process, queue, start state, best moves so far) and animation
+        self._worker = None
+        self._best = None
+        self._animation = None
+        # Canvas item of each sticker, the colours on screen, and a pending redraw
+        self._stickers = []
+        self._drawn = []
+        self._redraw = None
         self._build_ui()
         self._draw_cube()
+        # Off the Tk thread, so the window stays live; Solve is enabled once it is done
+        self._loader = threading.Thread(target=_prepare_solver, daemon=True)
+        self._loader.start()
+        self.solve_button.config(state=tk.DISABLED)
+        self.status.config(text="Loading solver tables...")
+        self.after(POLL_MS, self._poll_loader)
+
+    def _poll_loader(self):
+        if self._loader.is_alive():
+            self.after(POLL_MS, self._poll_loader)
+            return
+        self._loader = None
+        self.solve_button.config(state=tk.NORMAL)
+        self.status.config(text="Ready.")
 
     def _build_ui(self):
         self.canvas = tk.Canvas(self, width=355, height=265, bg='gray90', highlightthickness=0)
@@ -43,7 +119,8 @@ class CubeGUI(tk.Tk):
         self.scramble_len.grid(row=row+1, column=1, columnspan=2, pady=8)
 
         tk.Button(self, text="Reset", bg="#f9dfcf", command=self.reset).grid(row=row+1, column=3, padx=3, pady=8)
-        tk.Button(self, text="Solve", bg="#d4f5d8", fg='black', command=self.solve).grid(row=row+1, column=4, padx=3, pady=8)
+        self.solve_button = tk.Button(self, text="Solve", bg="#d4f5d8", fg='black', command=self.solve)
+        self.solve_button.grid(row=row+1, column=4, padx=3, pady=8)
         tk.Button(self, text="Undo", bg="#ffd6d6", command=self.undo_move).grid(row=row+1, column=5, padx=3, pady=8)
 
         self.status = tk.Label(self, text="", anchor='w', font=('Arial', 10), fg="#254441", bg='#e5f5f1')
@@ -54,29 +131,50 @@ class CubeGUI(tk.Tk):
         self.scramble_display.grid(row=row+3, column=0, columnspan=6, sticky='we')
         self.solution_display = tk.Label(self, text="Solution: ", anchor='w', font=('Consolas', 9), bg="#f6faf8")
         self.solution_display.grid(row=row+4, column=0, columnspan=6, sticky='we')
+        self._create_stickers()
 
     def destroy_gui(self):
+        self.cancel_solve()
+        try:
+            self.cache.save()
+        except OSError:
+            pass
         self.destroy()
 
-    def _draw_cube(self):
+    def _create_stickers(self):
+        """Create the 54 sticker rectangles once; redraws only recolour them."""
         # Coordinates for the 6 faces on a 2D net
         face_pos = {
             'U': (3, 0), 'L': (0, 3), 'F': (3, 3),
             'R': (6, 3), 'B': (9, 3), 'D': (3, 6)
         }
         size = 27
-        self.canvas.delete("cubesticker")
-        for idx, face in enumerate(['U','L','F','R','B','D']):
+        self._stickers = [None] * 54
+        for face_idx, face in enumerate('URFDLB'):
             fx, fy = face_pos[face]
-            facelet = self.cube.state[idx*9:(idx+1)*9]
             for j in range(3):
                 for i in range(3):
-                    color = COLOR_MAP[facelet[j*3 + i]]
                     x0, y0 = (fx+i)*size+5, (fy+j)*size+5
                     x1, y1 = x0+size-2, y0+size-2
-                    self.canvas.create_rectangle(x0, y0, x1, y1, fill=color, outline='black', tags="cubesticker")
+                    self._stickers[face_idx*9 + j*3 + i] = self.canvas.create_rectangle(
+                        x0, y0, x1, y1, fill='', outline='black', tags="cubesticker")
+        self._drawn = [None] * 54
+
+    def _draw_cube(self):
+        """Schedule a redraw; every state change before the next idle moment shares one."""
+        if self._redraw is None:
+            self._redraw = self.after_idle(self._redraw_now)
+
+    def _redraw_now(self):
+        self._redraw = None
+        state = self.cube.state
+        for i, colour in enumerate(state):
+            if self._drawn[i] != colour:
+                self.canvas.itemconfigure(self._stickers[i], fill=COLOR_MAP[colour])
+                self._drawn[i] = colour
 
     def do_move(self, move):
+        self.cancel_solve()
         self.cube.apply_move(move)
         self.solution_sequence.append(move)
         self._draw_cube()
@@ -85,10 +183,10 @@ class CubeGUI(tk.Tk):
 
     def undo_move(self):
         # Undo last manual move (if any)
+        self.cancel_solve()
         if self.solution_sequence:
             last_move = self.solution_sequence.pop()
-            inv_move = last_move[0] + ("'" if "'" not in last_move else "")
-            self.cube.apply_move(inv_move)
+            self.cube.apply_move(inverse_move(last_move))
             self._draw_cube()
             self.status.config(text=f'Undid move: {last_move}')
             self.update_solution_display()
@@ -114,6 +212,7 @@ class CubeGUI(tk.Tk):
         self.update_solution_display()
 
     def reset(self):
+        self.cancel_solve()
         self.cube = RubiksCube()
         self.scramble_sequence.clear()
         self.solution_sequence.clear()
@@ -123,31 +222,102 @@ class CubeGUI(tk.Tk):
         self.update_solution_display()
 
     def solve(self):
+        """Start solving in a worker process; the Solve button turns into Cancel."""
+        if self._worker is not None or self._animation is not None or self._loader is not None:
+            return
+        state = CubeState.from_cube(self.cube)
+        hit, solution = self.cache.get(state, max_depth=30, metric='htm', engine='anytime_solve')
+        if hit:
+            self._finish_solve(solution)
+            return
+        out = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_solve_worker, args=(bytes(state), SOLVE_TIMEOUT, out),
+                                          daemon=True)
+        process.start()
+        self._worker = (process, out, state)
+        self._best = None
+        self.solve_button.config(text="Cancel", command=self.cancel_solve)
         self.status.config(text="Solving... Please wait.")
-        self.update()
-        scramble_snapshot = self.scramble_sequence.copy()
-
-        def solver_thread():
-            solution = a_star_solve(self.cube, max_depth=40, timeout=30)
-            if solution:
-                # Animate application
-                for move in solution:
-                    self.cube.apply_move(move)
-                    self._draw_cube()
-                    self.status.config(text=f"Solving... move: {move}")
-                    self.update()
-                    self.after(180)
-                self.status.config(text=f"Solved! Moves: {' '.join(solution)} (len={len(solution)})")
-                self.solution_sequence = solution
-                self.update_solution_display()
-            else:
-                self.status.config(text="No solution found (try longer timeout/depth for harder scrambles).")
-                self.solution_sequence = []
-                self.update_solution_display()
-
-        t = threading.Thread(target=solver_thread)
-        t.daemon = True
-        t.start()
+        self.after(POLL_MS, self._poll_solver)
+
+    def _poll_solver(self):
+        """Drain the solver's queue (on the Tk thread) and show its progress."""
+        if self._worker is None:
+            return
+        process, out, state = self._worker
+        while True:
+            try:
+                message = out.get_nowait()
+            except queue.Empty:
+                break
+            kind = message[0]
+            if kind == 'progress':
+                _, nodes, rate = message
+                best = f"; best {len(self._best)} moves" if self._best is not None else ""
+                self.status.config(text=f"Solving... {nodes:,} nodes, {rate:,.0f} nodes/s{best}")
+            elif kind == 'update':
+                _, moves, seconds, nodes, optimal = message
+                self._best = moves
+                label = "optimal" if optimal else "refining"
+                self.status.config(text=f"Solving... {len(moves)} moves after {seconds:.2f}s ({label})")
+            elif kind == 'error':
+                self._stop_worker()
+                self.status.config(text=f"Cannot solve: {message[1]}")
+                return
+            else:  # done
+                self._stop_worker()
+                if self._best is not None:
+                    # No solution only means SOLVE_TIMEOUT ran out, which must not be cached as a failure
+                    self.cache.put(state, self._best, max_depth=30, metric='htm', engine='anytime_solve')
+                self._finish_solve(self._best)
+                return
+        if not process.is_alive() and out.empty():
+            self._stop_worker()
+            self.status.config(text="Solver stopped unexpectedly.")
+            return
+        self.after(POLL_MS, self._poll_solver)
+
+    def _stop_worker(self):
+        process, out, _ = self._worker
+        self._worker = None
+        if process.is_alive():
+            process.kill()
+        process.join()
+        out.close()
+        self.solve_button.config(text="Solve", command=self.solve)
+
+    def cancel_solve(self):
+        """Stop a running search (killing its process) or solution animation."""
+        if self._worker is not None:
+            self._stop_worker()
+            self.status.config(text="Solve cancelled.")
+        if self._animation is not None:
+            self.after_cancel(self._animation)
+            self._animation = None
+            self.status.config(text="Animation stopped.")
+
+    def _finish_solve(self, solution):
+        if solution:
+            # Merge and cancel redundant moves so the animation is no longer than it needs to be
+            solution = optimize_solution(solution)
+            self.solution_sequence = list(solution)
+            self.update_solution_display()
+            self._animate(list(solution), 0)
+        else:
+            self.status.config(text="No solution found (try longer timeout/depth for harder scrambles).")
+            self.solution_sequence = []
+            self.update_solution_display()
+
+    def _animate(self, solution, i):
+        """Apply one solution move per tick, scheduled with after() so the UI stays live."""
+        if i == len(solution):
+            self._animation = None
+            self.status.config(text=f"Solved! Moves: {' '.join(solution)} (len={len(solution)})")
+            return
+        self.cube.apply_move(solution[i])
+        self._draw_cube()
+        self.status.config(text=f"Solving... move: {solution[i]}")
+        self._animation = self.after(ANIMATION_MS, self._animate, solution, i + 1)
 
     def update_scramble_display(self):
         scramble_txt = f"Scramble: {' '.join(self.scramble_sequence) if self.scramble_sequence else '(solved)'}"
@@ -2,7 +2,7 @@
 
 import time
 from cube import RubiksCube
-from solver import a_star_solve
+from solver import SearchStats, a_star_solve
 
 def print_solution(scramble, solution, elapsed):
     print("Scramble applied:", ' '.join(scramble))
@@ -26,10 +26,12 @@ if __name__ == "__main__":
     start_time = time.time()
 
     # Updated: Use recommended max_depth and timeout
-    solution = a_star_solve(cube, max_depth=22, timeout=10)
+    stats = SearchStats()
+    solution = a_star_solve(cube, max_depth=22, timeout=10, stats=stats)
     elapsed = time.time() - start_time
 
     print_solution(scramble_moves, solution, elapsed)
+    print("Search stats:", stats)
 
     if solution:
         for move in solution:
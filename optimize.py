@@ -0,0 +1,98 @@
+# optimize.py
+
+from cube import FACES, METRIC_MOVES, SOLVED_STATE, inverse_move
+from endgame import EndgameTable, _build_records, endgame_table
+
+# Opposite faces turn about the same axis and commute
+_AXIS = {'U': 0, 'D': 0, 'R': 1, 'L': 1, 'F': 2, 'B': 2}
+_QUARTERS = {'': 1, '2': 2, "'": 3}
+_NOTATION = {
+    'htm': {1: ('',), 2: ('2',), 3: ("'",)},
+    'qtm': {1: ('',), 2: ('', ''), 3: ("'",)},
+}
+
+# Longest window tried for replacement, and the in-memory table depth used
+# when no endgame table is on disk (built once, in well under a second)
+MAX_WINDOW = 12
+# Shortest window worth a lookup: every normalized sequence of up to 4 half
+# turns (5 quarter turns) is optimal, checked exhaustively against the tables
+_MIN_WINDOW = {'htm': 5, 'qtm': 6}
+_FALLBACK_DEPTHS = {'qtm': 4, 'htm': 3}
+_FALLBACK = {}
+
+
+def normalize(moves, metric='htm'):
+    """
+    Merge every run of moves on one axis into at most one turn per face, in
+    URFDLB order, dropping faces whose turns cancel. Runs are kept on a
+    stack, so a run that cancels completely lets its neighbours merge
+    ("R U D U' D' R'" -> []). In QTM, half turns come out as two quarter turns.
+    """
+    stack = []
+    for move in moves:
+        face, turns = move[0], _QUARTERS[move[1:]]
+        axis = _AXIS[face]
+        if stack and stack[-1][0] == axis:
+            run = stack[-1][1]
+            run[face] = (run.get(face, 0) + turns) % 4
+            if not any(run.values()):
+                stack.pop()
+        else:
+            stack.append((axis, {face: turns}))
+    notation = _NOTATION[metric]
+    result = []
+    for _, run in stack:
+        for face in FACES:
+            if run.get(face):
+                result.extend(face + suffix for suffix in notation[run[face]])
+    return result
+
+
+def _table(metric):
+    table = endgame_table(metric)
+    if table is None:
+        table = _FALLBACK.get(metric)
+        if table is None:
+            depth = _FALLBACK_DEPTHS[metric]
+            table = _FALLBACK[metric] = EndgameTable(metric, depth, _build_records(metric, depth))
+    return table
+
+
+def _shorter_window(moves, table, max_window):
+    """
+    First window (start, end, replacement) whose net effect has an optimal
+    sequence in the endgame table shorter than the window, or None.
+    """
+    min_window = _MIN_WINDOW[table.metric]
+    for start in range(len(moves) - min_window + 1):
+        state = SOLVED_STATE.apply_moves(moves[start:start + min_window - 1])
+        for end in range(start + min_window - 1, min(len(moves), start + max_window)):
+            state = state.apply(moves[end])
+            tail = table.solve(state)
+            if tail is not None and len(tail) < end - start + 1:
+                # window + tail == identity, so the window equals the inverse of tail
+                return start, end + 1, [inverse_move(m) for m in reversed(tail)]
+    return None
+
+
+def optimize_solution(moves, metric='htm', max_window=MAX_WINDOW):
+    """
+    Shorten a move sequence without changing what it does:
+    - normalize() merges and cancels same-axis moves, including inverse
+      pairs separated by opposite-face moves ("U D U'" -> "D").
+    - Every window of up to `max_window` moves whose net effect is within
+      the metric's endgame table is replaced by the table's optimal sequence
+      when that is shorter ("R2 U2" x 5 -> "U2 R2").
+    Returns a new list of moves in the metric (QTM results use only quarter
+    turns), never longer than the input's length in that metric.
+    """
+    if metric not in METRIC_MOVES:
+        raise ValueError(f"Unknown metric {metric!r} (expected 'qtm' or 'htm').")
+    moves = normalize(moves, metric)
+    table = _table(metric)
+    while True:
+        window = _shorter_window(moves, table, max_window)
+        if window is None:
+            return moves
+        start, end, replacement = window
+        moves = normalize(moves[:start] + replacement + moves[end:], metric)
@@ -0,0 +1,253 @@
+# pruning.py
+
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+from cube import FACES, N_UD_SYMMETRIES
+from cubie import (move_table, slice_classes, twist_conj_table, MOVE_CUBES, MOVE_INDEX, PHASE2_MOVES, N_MOVE,
+                   N_TWIST, N_FLIP, N_SLICE, N_SLICE_CLASSES, N_CORNERS, N_UD_EDGES)
+
+# Quarter-turn move indices (into cubie.MOVE_NAMES), the metric a_star_solve searches in
+QUARTER_TURNS = [MOVE_INDEX[face + suffix] for face in FACES for suffix in ('', "'")]
+# All 18 face turns (half-turn metric)
+ALL_MOVES = list(range(N_MOVE))
+
+UNSEEN = 0xFF
+
+# Pattern databases: name -> (first coordinate, size), (second coordinate, size), moves.
+# Each entry is the exact number of moves (from that move set) needed to bring
+# the pair of coordinates home, i.e. an admissible lower bound for the search
+# that uses the same moves.
+PDB_SPECS = {
+    # corner permutation
+    'corners': (('corners', N_CORNERS), (None, 1), QUARTER_TURNS),
+    # corner orientation + positions of the UD-slice edges
+    'twist_slice': (('twist', N_TWIST), ('slice', N_SLICE), QUARTER_TURNS),
+    # edge orientation + positions of the UD-slice edges (edge subset)
+    'flip_slice': (('flip', N_FLIP), ('slice', N_SLICE), QUARTER_TURNS),
+    # Half-turn metric versions; the slice tables are also the two-phase solver's phase 1 heuristic
+    'corners_htm': (('corners', N_CORNERS), (None, 1), ALL_MOVES),
+    'twist_slice_htm': (('twist', N_TWIST), ('slice', N_SLICE), ALL_MOVES),
+    'flip_slice_htm': (('flip', N_FLIP), ('slice', N_SLICE), ALL_MOVES),
+    # Phase 2 (G1 moves only): corner / U-D edge permutation + order of the slice edges
+    'corners_slice_p2': (('corners', N_CORNERS), ('slice_sorted', 24), PHASE2_MOVES),
+    'ud_edges_slice_p2': (('ud_edges', N_UD_EDGES), ('slice_sorted', 24), PHASE2_MOVES),
+}
+
+# Symmetry-reduced tables: the twist+slice distance is the same for all 16
+# UD-axis conjugates, so only one slice per symmetry class is stored, at
+# index class_of[slice] * N_TWIST + twist_conj[16 * twist + sym_of[slice]]
+# (see cubie.slice_classes / cubie.twist_conj_table). 45 classes instead of
+# 495 slices shrinks these tables about 11x.
+SYM_REDUCED = {'twist_slice', 'twist_slice_htm'}
+
+# On-disk tables: header + depths packed two per byte (low nibble = even index).
+# Bump TABLE_VERSION whenever the file layout or the meaning of an entry changes;
+# the fingerprint also covers the move definitions, so edits to cube.py's move
+# maps invalidate old files automatically.
+TABLE_DIR = os.environ.get('CUBE_TABLE_DIR',
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tables'))
+TABLE_VERSION = 2
+_MAGIC = b'RCPD'
+_HEADER = struct.Struct('<4sHxxI16sI')  # magic, version, entries, fingerprint, crc32 of payload
+
+
+def _build_pdb(coord_a, n_a, coord_b, n_b, moves):
+    """
+    Breadth-first fill of a pattern database over index a * n_b + b, starting
+    from the solved value 0 of both coordinates. Returns a bytearray of depths.
+    """
+    table_a = move_table(coord_a)
+    table_b = move_table(coord_b) if coord_b else None
+    depths = bytearray([UNSEEN]) * (n_a * n_b)
+    depths[0] = 0
+    frontier = [0]
+    depth = 0
+    while frontier:
+        depth += 1
+        next_frontier = []
+        append = next_frontier.append
+        for idx in frontier:
+            a, b = divmod(idx, n_b)
+            row_a = N_MOVE * a
+            row_b = N_MOVE * b
+            for m in moves:
+                if table_b is None:
+                    child = table_a[row_a + m]
+                else:
+                    child = table_a[row_a + m] * n_b + table_b[row_b + m]
+                if depths[child] == UNSEEN:
+                    depths[child] = depth
+                    append(child)
+        frontier = next_frontier
+    return depths
+
+
+def _reduce_by_symmetry(depths):
+    """Keep the twist+slice entries of one representative slice per symmetry class."""
+    reps = slice_classes()[2]
+    reduced = bytearray(N_SLICE_CLASSES * N_TWIST)
+    for c, rep in enumerate(reps):
+        reduced[c * N_TWIST:(c + 1) * N_TWIST] = depths[rep::N_SLICE]
+    return reduced
+
+
+def _pack(depths):
+    """Pack one depth (0..15) per nibble."""
+    if len(depths) % 2:
+        depths = depths + b'\x00'
+    return bytes(lo | hi << 4 for lo, hi in zip(depths[0::2], depths[1::2]))
+
+
+def packed_entry(data, index):
+    """Entry `index` of a payload packed by _pack (two 4-bit entries per byte)."""
+    return (data[index >> 1] >> ((index & 1) << 2)) & 15
+
+
+def twist_slice_index():
+    """
+    Function (twist, slice) -> index into the symmetry-reduced twist+slice
+    tables (see SYM_REDUCED).
+    """
+    twist_conj = twist_conj_table()
+    slice_class, slice_sym, _ = slice_classes()
+
+    def index(twist, slc):
+        return slice_class[slc] * N_TWIST + twist_conj[N_UD_SYMMETRIES * twist + slice_sym[slc]]
+    return index
+
+
+def write_table(path, header, payload):
+    """Write header + payload to `path` atomically. Returns the path."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a temp file and rename, so concurrent readers never see a partial table
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(header)
+        f.write(payload)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+    return path
+
+
+def map_table(path):
+    """mmap a table file read-only; None if it is missing or empty."""
+    try:
+        with open(path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+
+def _fingerprint(name):
+    spec = (TABLE_VERSION, name, PDB_SPECS[name], name in SYM_REDUCED,
+            [(m.cp, m.co, m.ep, m.eo) for m in MOVE_CUBES])
+    return hashlib.sha256(repr(spec).encode()).digest()[:16]
+
+
+def table_path(name, directory=None):
+    return os.path.join(directory or TABLE_DIR, f"{name}.pdb")
+
+
+class PatternDatabase:
+    """
+    Read-only pattern database with 4-bit entries. `data` is the packed
+    payload (a memoryview over an mmap'ed file when loaded from disk, so
+    every process using the file shares one page-cache copy).
+    Entry i is (data[i >> 1] >> ((i & 1) << 2)) & 15.
+    """
+    __slots__ = ('name', 'size', 'data', '_mmap')
+
+    def __init__(self, name, size, data, mapped=None):
+        self.name = name
+        self.size = size
+        self.data = data
+        self._mmap = mapped
+
+    def __getitem__(self, index):
+        return packed_entry(self.data, index)
+
+    def __len__(self):
+        return self.size
+
+
+def _size(name):
+    if name in SYM_REDUCED:
+        return N_SLICE_CLASSES * N_TWIST
+    (_, n_a), (_, n_b), _ = PDB_SPECS[name]
+    return n_a * n_b
+
+
+def _build_payload(name):
+    (coord_a, n_a), (coord_b, n_b), moves = PDB_SPECS[name]
+    depths = _build_pdb(coord_a, n_a, coord_b, n_b, moves)
+    if name in SYM_REDUCED:
+        depths = _reduce_by_symmetry(depths)
+    return _pack(depths)
+
+
+def build_table(name, directory=None):
+    """Build the named pattern database and write it atomically to disk. Returns the path."""
+    payload = _build_payload(name)
+    header = _HEADER.pack(_MAGIC, TABLE_VERSION, _size(name), _fingerprint(name), zlib.crc32(payload))
+    return write_table(table_path(name, directory), header, payload)
+
+
+def load_table(name, directory=None):
+    """
+    mmap the named pattern database from disk. Returns None if the file is
+    missing, truncated, from another version/move set, or fails its checksum.
+    """
+    mapped = map_table(table_path(name, directory))
+    if mapped is None:
+        return None
+    size = _size(name)
+    if len(mapped) != _HEADER.size + (size + 1) // 2:
+        mapped.close()
+        return None
+    magic, version, entries, fingerprint, crc = _HEADER.unpack_from(mapped)
+    payload = memoryview(mapped)[_HEADER.size:]
+    if (magic != _MAGIC or version != TABLE_VERSION or entries != size
+            or fingerprint != _fingerprint(name) or zlib.crc32(payload) != crc):
+        payload.release()
+        mapped.close()
+        return None
+    return PatternDatabase(name, size, payload, mapped)
+
+
+_PDBS = {}
+
+
+def pattern_database(name, directory=None):
+    """
+    Return the named PatternDatabase. It is mmap'ed from the table directory;
+    a missing or stale file is rebuilt (and kept in memory only if the
+    directory is not writable).
+    """
+    key = (name, directory or TABLE_DIR)
+    pdb = _PDBS.get(key)
+    if pdb is None:
+        pdb = load_table(name, directory)
+        if pdb is None:
+            try:
+                build_table(name, directory)
+                pdb = load_table(name, directory)
+            except OSError:
+                pdb = None
+            if pdb is None:
+                pdb = PatternDatabase(name, _size(name), _build_payload(name))
+        _PDBS[key] = pdb
+    return pdb
+
+
+def build_tables(directory=None, force=False):
+    """Build every pattern database that is missing or stale. Returns {name: path}."""
+    paths = {}
+    for name in PDB_SPECS:
+        if force or load_table(name, directory) is None:
+            build_table(name, directory)
+        paths[name] = table_path(name, directory)
+    return paths
@@ -0,0 +1,300 @@
+# service.py
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from batch import ENGINES, check_options, parse_scramble, prepare_engine
+from cube import SOLVED_STATE
+
+# Seconds a worker may overrun the solver's own timeout before it is killed
+GRACE = 1.0
+
+
+class ServiceBusy(Exception):
+    """The request queue is full; the client should retry later."""
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed while it was queued or running."""
+
+
+def _worker_main(conn, engine):
+    """
+    Worker process: solve (scramble, timeout, options) requests from a pipe
+    until it closes. Replies (solution, seconds, error); a solver exception
+    is sent back as `error` instead of ending the process.
+    """
+    prepare_engine(engine)
+    while True:
+        try:
+            moves, timeout, options = conn.recv()
+        except EOFError:
+            return
+        cube = SOLVED_STATE.apply_moves(moves).to_cube()
+        start = time.perf_counter()
+        try:
+            solution = ENGINES[engine](cube, timeout=timeout, **options)
+        except Exception as exc:
+            conn.send((None, time.perf_counter() - start, f"{type(exc).__name__}: {exc}"))
+        else:
+            conn.send((solution, time.perf_counter() - start, None))
+
+
+class _Worker:
+    """One solver process and its pipe. Killing it is how a running search is cancelled."""
+
+    def __init__(self, engine):
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker_main, args=(child, engine), daemon=True)
+        self.process.start()
+        child.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+
+
+class SolveService:
+    """
+    Asynchronous front end for the CPU-bound solvers.
+    - `workers` solver processes (all cores by default) take requests from a
+      bounded queue of `queue_size`; solve() raises ServiceBusy when it is
+      full (backpressure) instead of piling up work.
+    - Every request has a deadline (its timeout, counted from submission).
+      A request whose deadline passes while queued never runs; a running
+      search gets the time left as its own timeout, and the worker is killed
+      if it overruns by more than GRACE seconds.
+    - Cancelling the awaiting task (e.g. the client went away) kills the
+      worker process running that search and starts a fresh one.
+    Use as `async with SolveService() as service: await service.solve(...)`.
+    """
+
+    def __init__(self, engine='two_phase', workers=None, queue_size=64, default_timeout=10):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine!r} (expected one of {', '.join(ENGINES)}).")
+        self.engine = engine
+        self.workers = workers or os.cpu_count()
+        self.queue_size = queue_size
+        self.default_timeout = default_timeout
+        self.counters = {'accepted': 0, 'rejected': 0, 'solved': 0, 'unsolved': 0, 'failed': 0,
+                         'expired': 0, 'cancelled': 0, 'restarts': 0}
+        self._queue = None
+        self._tasks = []
+
+    async def start(self):
+        # Load the tables once here, so forked workers start with them
+        await asyncio.get_running_loop().run_in_executor(None, prepare_engine, self.engine)
+        self._queue = asyncio.Queue(self.queue_size)
+        self._tasks = [asyncio.create_task(self._serve()) for _ in range(self.workers)]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def stats(self):
+        return dict(self.counters, queued=self._queue.qsize() if self._queue else 0,
+                    queue_size=self.queue_size, workers=self.workers)
+
+    async def solve(self, scramble, timeout=None, **options):
+        """
+        Solve a scramble ("R U2 F'" or a list of moves). Returns a dict with
+        solution (None if not found in time), length and seconds. Raises
+        ValueError for bad notation, an option the engine does not take or a
+        solver error, ServiceBusy when the queue is full and DeadlineExceeded
+        if the request expired before or while running.
+        """
+        moves = parse_scramble(scramble if isinstance(scramble, str) else ' '.join(scramble))
+        check_options(self.engine, options)
+        timeout = self.default_timeout if timeout is None else timeout
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((moves, time.monotonic() + timeout, options, future))
+        except asyncio.QueueFull:
+            self.counters['rejected'] += 1
+            raise ServiceBusy(f"{self.queue_size} requests already queued") from None
+        self.counters['accepted'] += 1
+        try:
+            return await future
+        except asyncio.CancelledError:
+            self.counters['cancelled'] += 1
+            future.cancel()
+            raise
+
+    async def _serve(self):
+        """Feed queued requests to one worker process, replacing it after a kill."""
+        worker = _Worker(self.engine)
+        try:
+            while True:
+                moves, deadline, options, future = await self._queue.get()
+                if future.done():
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.counters['expired'] += 1
+                    future.set_exception(DeadlineExceeded("deadline passed while queued"))
+                    continue
+                reply = None
+                try:
+                    worker.conn.send((moves, remaining, options))
+                    reply = asyncio.get_running_loop().run_in_executor(None, worker.conn.recv)
+                    done, _ = await asyncio.wait({reply, future}, timeout=remaining + GRACE,
+                                                 return_when=asyncio.FIRST_COMPLETED)
+                except asyncio.CancelledError:
+                    worker.kill()
+                    if reply is not None:
+                        await asyncio.gather(reply, return_exceptions=True)
+                    raise
+                if reply in done and reply.exception() is None:
+                    solution, seconds, error = reply.result()
+                    if error is not None:
+                        self.counters['failed'] += 1
+                        if not future.done():
+                            future.set_exception(ValueError(error))
+                        continue
+                    self.counters['solved' if solution is not None else 'unsolved'] += 1
+                    if not future.done():
+                        future.set_result({'solution': solution, 'length': None if solution is None
+                                           else len(solution), 'seconds': seconds})
+                    continue
+                # Cancelled by the caller, overran its deadline or crashed: stop the search for real
+                worker.kill()
+                await asyncio.gather(reply, return_exceptions=True)
+                worker.conn.close()
+                self.counters['restarts'] += 1
+                if not future.done():
+                    self.counters['expired'] += 1
+                    future.set_exception(DeadlineExceeded("search overran its deadline or its worker died"))
+                worker = _Worker(self.engine)
+        finally:
+            worker.kill()
+            worker.conn.close()
+
+
+async def _read_request(reader):
+    """Minimal HTTP/1.1 request parser: (method, path, body bytes)."""
+    request_line = await reader.readline()
+    if not request_line:
+        raise ConnectionResetError
+    method, path, _ = request_line.decode('latin-1').split(' ', 2)
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    body = await reader.readexactly(length) if length else b''
+    return method, path, body
+
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 503: 'Service Unavailable',
+            504: 'Gateway Timeout'}
+
+
+def _response(status, payload, extra_headers=''):
+    body = json.dumps(payload).encode()
+    head = (f"HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n{extra_headers}\r\n")
+    return head.encode() + body
+
+
+def _parse_solve_request(body):
+    """(scramble, timeout, engine options) from a POST /solve body; ValueError if it is malformed."""
+    try:
+        request = json.loads(body or b'{}')
+    except ValueError:
+        request = None
+    if not isinstance(request, dict) or 'scramble' not in request:
+        raise ValueError('expected a JSON object with "scramble"')
+    scramble = request.pop('scramble')
+    timeout = request.pop('timeout', None)
+    if not (isinstance(scramble, str) or isinstance(scramble, list)
+            and all(isinstance(move, str) for move in scramble)):
+        raise ValueError('"scramble" must be a string or a list of moves')
+    if timeout is not None and (isinstance(timeout, bool) or not isinstance(timeout, (int, float))):
+        raise ValueError('"timeout" must be a number of seconds')
+    return scramble, timeout, request
+
+
+async def _handle(service, reader, writer):
+    """
+    POST /solve {"scramble": "R U ...", "timeout": 5, ...engine options}
+    GET /stats. One request per connection; if the client disconnects
+    before the answer, the search is cancelled.
+    """
+    try:
+        method, path, body = await _read_request(reader)
+        if method == 'GET' and path == '/stats':
+            writer.write(_response(200, service.stats()))
+        elif method == 'POST' and path == '/solve':
+            try:
+                scramble, timeout, options = _parse_solve_request(body)
+            except ValueError as exc:
+                writer.write(_response(400, {'error': str(exc)}))
+            else:
+                solve = asyncio.ensure_future(service.solve(scramble, timeout, **options))
+                hangup = asyncio.ensure_future(reader.read(1))
+                await asyncio.wait({solve, hangup}, return_when=asyncio.FIRST_COMPLETED)
+                hangup.cancel()
+                if not solve.done():
+                    # The client closed the connection: cancel the search
+                    solve.cancel()
+                    await asyncio.gather(solve, return_exceptions=True)
+                    return
+                try:
+                    writer.write(_response(200, solve.result()))
+                except (ValueError, TypeError) as exc:
+                    writer.write(_response(400, {'error': str(exc)}))
+                except ServiceBusy as exc:
+                    writer.write(_response(503, {'error': str(exc)}, 'Retry-After: 1\r\n'))
+                except DeadlineExceeded as exc:
+                    writer.write(_response(504, {'error': str(exc)}))
+        else:
+            writer.write(_response(404, {'error': f"no route for {method} {path}"}))
+        await writer.drain()
+    except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host='127.0.0.1', port=8000, **service_options):
+    """Run the HTTP front end until cancelled."""
+    async with SolveService(**service_options) as service:
+        server = await asyncio.start_server(lambda r, w: _handle(service, r, w), host, port)
+        async with server:
+            print(f"Serving on http://{host}:{port} ({service.workers} workers, queue {service.queue_size})")
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m service', description="HTTP solve service (JSON).")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='two_phase')
+    parser.add_argument('--workers', type=int, default=None, help="Solver processes (default: all cores).")
+    parser.add_argument('--queue-size', type=int, default=64, help="Requests queued before answering 503.")
+    parser.add_argument('--timeout', type=float, default=10, help="Default per-request deadline in seconds.")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, engine=args.engine, workers=args.workers,
+                          queue_size=args.queue_size, default_timeout=args.timeout))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
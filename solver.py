@@ -1,132 +1,810 @@
 # solver.py
 
-from collections import deque
-from cube import RubiksCube
-import time
+from collections import OrderedDict, deque, namedtuple
+from cube import (RubiksCube, CubeState, StateBatch, METRIC_MOVES, SOLVED_STATE, SYM_MOVES, SYM_MULT,
+                  inverse_move)
+from cubie import CubieCube, MOVE_NAMES, N_MOVE, N_SLICE, U_EDGES, D_EDGES, move_table, verify_state
+from pruning import (ALL_MOVES, QUARTER_TURNS, TABLE_DIR, build_tables, packed_entry, pattern_database,
+                     twist_slice_index)
+from endgame import ENDGAME_DEPTHS, NO_MOVE, build_tables as build_endgame_tables, endgame_table
+from twophase import prepare_tables, two_phase_search, two_phase_solve
+from optimize import optimize_solution
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import tempfile
 import threading
+import time
 from heapq import heappush, heappop
 
 def heuristic(cube):
     """
     Improved admissible heuristic: counts the number of misplaced stickers,
     normalized for fairness (admissibility).
+    Accepts a RubiksCube or a bare CubeState.
     """
-    misplaced = sum(
-        1 for i in range(6) for j in range(9) if cube.state[i * 9 + j] != i
-    )
+    state = cube.state if isinstance(cube, RubiksCube) else cube
+    # One XOR against the solved state instead of a per-sticker Python loop
+    misplaced = StateBatch(bytes(state)).misplaced()[0]
     return misplaced // 8  # Slightly more aggressive than //12, still admissible
 
-def canonicalize(cube):
-    """Hash of the cube state used for state uniqueness."""
-    return tuple(cube.state)
+def canonicalize(cube, symmetry=False):
+    """
+    Hash of the cube state used for state uniqueness (a compact CubeState).
+    With symmetry=True, the representative of its class under the 48 cube
+    symmetries, so symmetric positions share one key.
+    """
+    state = CubeState.from_cube(cube)
+    return state.canonical() if symmetry else state
+
+def _metric_moves(metric):
+    try:
+        return METRIC_MOVES[metric]
+    except KeyError:
+        raise ValueError(f"Unknown metric {metric!r} (expected 'qtm' or 'htm').") from None
 
-def a_star_solve(start_cube, max_depth=22, timeout=10):
+def is_redundant(move, path, metric='qtm'):
+    """
+    Move pruning shared by the sticker-level solvers:
+    - HTM: never turn the same face twice in a row (X X is the single move X2).
+    - QTM: the only same-face pair is "X X" (a half turn); never "X X'",
+      "X' X'" (same as X X) or "X X X" (same as X').
+    """
+    if not path or move[0] != path[-1][0]:
+        return False
+    if metric == 'htm':
+        return True
+    return move != path[-1] or move.endswith("'") or (len(path) > 1 and path[-2] == move)
+
+class SearchStats:
+    """
+    Counters filled in by a_star_solve(..., stats=SearchStats()).
+    - generated / expanded: children created / nodes popped and expanded;
+      duplicates: children dropped because they were already visited;
+      depth_pruned: nodes popped at max_depth and not expanded.
+    - peak_open / peak_visited: largest heap and visited-set sizes.
+    - h_counts: {h: children generated with that heuristic value}.
+    - move_time: seconds spent expanding nodes (applying moves to the batch);
+      heuristic_time: scoring the children (misplaced-sticker counts);
+      bookkeeping_time: the rest of the per-child work (pruning, symmetry
+      reduction, visited lookups, endgame lookups, node arrays, heap pushes).
+    - outcome: 'solved', 'endgame', 'timeout', 'bound', 'exhausted'
+      (no solution within max_depth).
+    `callback(stats)`, if given, is called every `interval` expansions while
+    the search runs, and once at the end.
+    """
+
+    def __init__(self, callback=None, interval=4096):
+        self.callback = callback
+        self.interval = interval
+        self.generated = 0
+        self.expanded = 0
+        self.duplicates = 0
+        self.depth_pruned = 0
+        self.peak_open = 0
+        self.peak_visited = 0
+        self.h_counts = {}
+        self.move_time = 0.0
+        self.heuristic_time = 0.0
+        self.bookkeeping_time = 0.0
+        self.elapsed = 0.0
+        self.outcome = None
+
+    @property
+    def nodes_per_sec(self):
+        return self.expanded / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def branching_factor(self):
+        """Mean new children per expanded node (after pruning and duplicates)."""
+        return (self.generated - self.duplicates) / self.expanded if self.expanded else 0.0
+
+    def as_dict(self):
+        return {'outcome': self.outcome, 'generated': self.generated, 'expanded': self.expanded,
+                'duplicates': self.duplicates, 'depth_pruned': self.depth_pruned,
+                'peak_open': self.peak_open, 'peak_visited': self.peak_visited,
+                'h_counts': dict(sorted(self.h_counts.items())), 'elapsed': self.elapsed,
+                'nodes_per_sec': self.nodes_per_sec, 'branching_factor': self.branching_factor,
+                'move_time': self.move_time, 'heuristic_time': self.heuristic_time,
+                'bookkeeping_time': self.bookkeeping_time}
+
+    def __str__(self):
+        h = ' '.join(f"{k}:{v}" for k, v in sorted(self.h_counts.items()))
+        return (f"{self.outcome}: {self.expanded} expanded, {self.generated} generated "
+                f"({self.duplicates} duplicates, {self.depth_pruned} at depth limit), "
+                f"branching {self.branching_factor:.2f}, peak heap {self.peak_open}, "
+                f"peak visited {self.peak_visited}, {self.nodes_per_sec:.0f} nodes/s in {self.elapsed:.2f}s "
+                f"(moves {self.move_time:.2f}s, heuristic {self.heuristic_time:.2f}s, "
+                f"bookkeeping {self.bookkeeping_time:.2f}s); h counts {h}")
+
+def a_star_solve(start_cube, max_depth=22, timeout=10, metric='qtm', symmetry=False, bound=None, stats=None):
     """
     Practical A* solver for Rubik's Cube.
     - Move pruning avoids redundant & inverse moves on same face.
     - Timeout for hackathon reliability.
+    - metric: 'qtm' (quarter turns, X2 = two moves) or 'htm' (X2 is one move).
+    - symmetry: search on symmetry-class representatives, so only one of up to
+      48 symmetric positions is stored. Each node remembers the symmetry that
+      maps the real position onto its representative, and moves are translated
+      through it (SYM_MOVES), so the returned path is for the real cube.
+    - bound: optional callable returning the length a solution must beat,
+      polled every few hundred nodes. Paths that cannot beat it are dropped,
+      and the search gives up once the bound reaches 0.
+    - If an endgame table for the metric is on disk (see endgame.py), a start
+      state inside it is solved optimally by table walk, and the search ends
+      as soon as it reaches a state inside it.
+    - stats: optional SearchStats, filled in with search counters and timings
+      (no cost when omitted).
+    - An unsolvable state (twisted corner, flipped edge, parity) raises
+      ValueError before any search (cubie.verify_state).
     """
+    verify_state(start_cube.state)
     if start_cube.is_solved():
+        if stats is not None:
+            stats.outcome = 'solved'
         return []
-    
-    MOVES = ['U', "U'", 'D', "D'", 'F', "F'", 'B', "B'", 'L', "L'", 'R', "R'"]
-    start_time = time.time()
+    _metric_moves(metric)
+    deadline = time.time() + timeout
+    start = CubeState.from_cube(start_cube)
+    endgame = endgame_table(metric)
+    if endgame is not None:
+        tail = endgame.solve(start)
+        if tail is not None:
+            if stats is not None:
+                stats.outcome = 'endgame'
+            return tail if len(tail) <= max_depth else None
+    path, _ = _a_star_search(start, max_depth, deadline, metric, symmetry, bound, endgame, stats)
+    return path
+
+# Heap key of an A* node: f << _F_SHIFT | g << _NODE_BITS | (_NODE_MASK - node)
+_NODE_BITS = 32
+_NODE_MASK = (1 << _NODE_BITS) - 1
+_F_SHIFT = _NODE_BITS + 8
+
+def _a_star_search(start, max_depth, deadline, metric='qtm', symmetry=False, bound=None, endgame=None,
+                   stats=None):
+    """
+    A* core. Nodes live in flat arrays instead of per-node path lists: node i
+    has parents[i], moves[i] (index into the metric's moves), syms[i] (its
+    symmetry frame), states[i] and misplaced[i], its misplaced-sticker count
+    (from the parent's batch scoring, so the solved test is misplaced[i] == 0
+    instead of a rescan). Heap entries are single ints packing
+    f, g and the node (see _NODE_BITS), ordered by f, then g, then newest
+    node first. The path is only rebuilt from the parent links once a
+    solution is found.
+    With a SearchStats, counters and timings are recorded per expanded node,
+    not per child, so a search without one pays only a few local tests.
+    Returns (path or None, nodes expanded).
+    """
+    MOVES = _metric_moves(metric)
+    timed = stats is not None
+    clock = time.perf_counter
+    started = clock()
+    parents = array('i', [-1])
+    moves = bytearray([NO_MOVE])
+    syms = bytearray([0])
+    if symmetry:
+        start, syms[0] = start.canonical_with_symmetry()
+    states = [start]
+    misplaced = bytearray(StateBatch(start).misplaced())
+    open_set = [misplaced[0] // 8 << _F_SHIFT | _NODE_MASK]
+    visited = {start}
+    popped = 0
 
-    open_set = []
-    g0 = 0
-    h0 = heuristic(start_cube)
-    heappush(open_set, (g0 + h0, g0, [], canonicalize(start_cube)))
-    visited = set()
-    visited.add(canonicalize(start_cube))
+    def trace(node):
+        path = []
+        while node > 0:
+            path.append(MOVES[moves[node]])
+            node = parents[node]
+        path.reverse()
+        return path
+
+    def report():
+        # Every child is either a duplicate or a new visited state
+        stats.peak_visited = len(visited)
+        stats.generated = stats.duplicates + len(visited) - 1
+        stats.elapsed = clock() - started
+        if stats.callback is not None:
+            stats.callback(stats)
+
+    def finish(path, outcome):
+        if timed:
+            stats.outcome = outcome
+            report()
+        return path, popped
 
     while open_set:
-        if time.time() - start_time > timeout:
+        if time.time() > deadline:
             # Timeout: return best found (if any) or None
-            return None
-        f, depth, path, state_hash = heappop(open_set)
-        cube = RubiksCube(list(state_hash))
-        if cube.is_solved():
-            return path
+            return finish(None, 'timeout')
+        popped += 1
+        if bound is not None and not popped & 255:
+            limit = bound()
+            if limit <= 0:
+                return finish(None, 'bound')
+            max_depth = min(max_depth, limit - 1)
+        key = heappop(open_set)
+        depth = (key >> _NODE_BITS) & 0xFF
+        node = _NODE_MASK - (key & _NODE_MASK)
+        if not misplaced[node]:
+            return finish(trace(node), 'solved')
         if depth >= max_depth:
+            if timed:
+                stats.depth_pruned += 1
             continue
-        for move in MOVES:
-            # Prune: skip consecutive moves on same face (e.g. "R R")
-            if path and move[0] == path[-1][0]:
+        if timed:
+            stats.expanded += 1
+            if len(open_set) >= stats.peak_open:
+                stats.peak_open = len(open_set) + 1
+            if not stats.expanded % stats.interval and stats.callback is not None:
+                report()
+            t0 = clock()
+        # Last two moves, for the same-face pruning
+        recent = [MOVES[moves[i]] for i in (parents[node], node) if i > 0]
+        sym = syms[node]
+        sym_moves = SYM_MOVES[sym]
+        # All children and their misplaced-sticker counts in one batch
+        children = StateBatch(states[node]).expand([sym_moves[move] for move in MOVES])
+        if timed:
+            t1 = clock()
+            stats.move_time += t1 - t0
+        scores = children.misplaced()
+        if timed:
+            t0 = clock()
+            stats.heuristic_time += t0 - t1
+        for j, move in enumerate(MOVES):
+            # Prune: skip inverse and redundant same-face moves (e.g. "R R'")
+            if is_redundant(move, recent, metric):
                 continue
-            # Prune: skip immediate inverse (e.g. "R R'")
-            if path and (move[0] == path[-1][0]) and ("'" in move) != ("'" in path[-1]):
+            next_state = children[j]
+            next_sym = sym
+            if symmetry:
+                next_state, t = next_state.canonical_with_symmetry()
+                next_sym = SYM_MULT[t][sym]
+            if next_state in visited:
+                if timed:
+                    stats.duplicates += 1
                 continue
-            next_cube = cube.copy()
-            next_cube.apply_move(move)
-            next_hash = canonicalize(next_cube)
-            if next_hash in visited:
-                continue
-            visited.add(next_hash)
+            visited.add(next_state)
+            if endgame is not None:
+                tail = endgame.solve(next_state)
+                if tail is not None and depth + 1 + len(tail) <= max_depth:
+                    # The table walk is in the representative's frame; map it back
+                    real_moves = {framed: real for real, framed in SYM_MOVES[next_sym].items()}
+                    return finish(trace(node) + [move] + [real_moves[m] for m in tail], 'endgame')
+            child = len(moves)
+            parents.append(node)
+            moves.append(j)
+            syms.append(next_sym)
+            states.append(next_state)
+            misplaced.append(scores[j])  # conjugation keeps the count
             g = depth + 1
-            h = heuristic(next_cube)
-            heappush(open_set, (g + h, g, path + [move], next_hash))
-    return None  # No solution found in time
+            h = scores[j] // 8  # heuristic(), which is symmetry invariant
+            if timed:
+                stats.h_counts[h] = stats.h_counts.get(h, 0) + 1
+            heappush(open_set, (g + h) << _F_SHIFT | g << _NODE_BITS | (_NODE_MASK - child))
+        if timed:
+            stats.bookkeeping_time += clock() - t0
+    return finish(None, 'exhausted')  # No solution within max_depth
+
+# Length of the best solution found so far by any worker (shared memory, set
+# by _init_worker); 0 tells every worker to stop.
+_BEST = None
+
+def _init_worker(best):
+    global _BEST
+    _BEST = best
 
-def parallel_a_star_solve(start_cube, max_depth=22, timeout=10):
+def _solve_prefix(state, prefix, max_depth, deadline, budget, metric):
     """
-    Parallelizes the first move to explore multiple branches quickly.
-    Returns the shortest solution found by any thread within the timeout.
+    Worker task: A* below one move prefix for at most `budget` seconds,
+    bounded by the shared best length. Returns (solution or None, finished);
+    finished is False if the budget ran out before the subtree was searched.
+    """
+    started = time.time()
+    remaining = min(budget, deadline - started)
+    if remaining <= 0 or _BEST.value <= len(prefix) + 1:
+        return None, True
+    path = a_star_solve(CubeState(state).to_cube(), max_depth=max_depth - len(prefix), timeout=remaining,
+                        metric=metric, bound=lambda: _BEST.value - len(prefix))
+    if path is None:
+        return None, time.time() - started < remaining
+    solution = prefix + path
+    with _BEST.get_lock():
+        if len(solution) < _BEST.value:
+            _BEST.value = len(solution)
+    return solution, True
+
+def _prefixes(start, depth, metric):
+    """
+    Distinct states reachable in exactly `depth` pruned moves, as
+    {state: moves}. Returns (None, solution) if the cube is solved on the way.
+    """
+    moves = _metric_moves(metric)
+    level = {start: []}
+    seen = {start}
+    for _ in range(depth):
+        next_level = {}
+        for state, path in level.items():
+            for move in moves:
+                if is_redundant(move, path, metric):
+                    continue
+                child = state.apply(move)
+                if child.is_solved():
+                    return None, path + [move]
+                if child not in seen:
+                    seen.add(child)
+                    next_level[child] = path + [move]
+        level = next_level
+    return level, None
+
+def parallel_a_star_solve(start_cube, max_depth=22, timeout=10, metric='qtm', workers=None, prefix_depth=2,
+                          exhaustive=False, budget=0.05):
     """
+    Runs a_star_solve below every distinct `prefix_depth`-move prefix on a
+    process pool (all cores by default), so the search is not bound by the GIL.
+    - Prefixes are queued most promising first (lowest moves + heuristic).
+      Each task gets `budget` seconds; unfinished prefixes are requeued with
+      twice the budget, so no single hard subtree holds a core to the deadline.
+    - A shared best length lets workers drop paths that cannot beat the best
+      solution found so far, and skip prefixes that are already too long.
+    - By default the search stops at the first solution and returns the
+      shortest of those finished by then. exhaustive=True keeps searching the
+      other prefixes (under the shared bound) until they finish or time out.
+    - Every worker has stopped and the pool is shut down when this returns.
+    - The returned solution goes through optimize.optimize_solution, which
+      only ever shortens it.
+    """
+    verify_state(start_cube.state)
     if start_cube.is_solved():
         return []
-    MOVES = ['U', "U'", 'D', "D'", 'F', "F'", 'B', "B'", 'L', "L'", 'R', "R'"]
+    deadline = time.time() + timeout
+    level, solution = _prefixes(CubeState.from_cube(start_cube), prefix_depth, metric)
+    if solution is not None:
+        return solution
+    tasks = sorted(level.items(), key=lambda item: len(item[1]) + heuristic(item[0]))
+    best = multiprocessing.Value('i', max_depth + 1)
     solutions = []
-    threads = []
-    found = threading.Event()
-    lock = threading.Lock()
+    pending = {}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                             initializer=_init_worker, initargs=(best,)) as pool:
+        while tasks and (exhaustive or not solutions) and time.time() < deadline:
+            pending = {pool.submit(_solve_prefix, bytes(state), prefix, max_depth, deadline, budget, metric):
+                       (state, prefix) for state, prefix in tasks}
+            unfinished = []
+            while pending and (exhaustive or not solutions):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = pending.pop(future)
+                    path, finished = future.result()
+                    if path is not None:
+                        solutions.append(path)
+                    elif not finished:
+                        unfinished.append(task)
+            # Keep the most promising order for the next, longer round
+            order = {task[0]: i for i, task in enumerate(tasks)}
+            tasks = sorted(unfinished, key=lambda task: order[task[0]])
+            budget *= 2
+        # Stop running workers at their next poll; cancel tasks not yet started
+        # (by hand: shutdown's cancel_futures needs Python 3.9)
+        best.value = 0
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=True)
+    if solutions:
+        return optimize_solution(min(solutions, key=len), metric)
+    return None
+
+class _SearchTimeout(Exception):
+    pass
+
+def ida_star_solve(start_cube, max_depth=22, timeout=10, metric='qtm'):
+    """
+    Memory-light IDA* solver (optimal in the chosen metric).
+    - Depth-first search under an increasing f-bound; only the current path is stored.
+    - Runs on cubie coordinates with precomputed move tables.
+    - Heuristic: max of the corner-permutation, twist+slice and flip+slice
+      pattern databases for the metric; in QTM rounded up to the parity of
+      the corner permutation.
+    - Scrambles inside the metric's endgame table (if built) are answered by
+      table walk without searching.
+    - An unsolvable state raises ValueError before any search.
+    """
+    verify_state(start_cube.state)
+    if start_cube.is_solved():
+        return []
+    _metric_moves(metric)
+    endgame = endgame_table(metric)
+    if endgame is not None:
+        tail = endgame.solve(CubeState.from_cube(start_cube))
+        if tail is not None:
+            return tail if len(tail) <= max_depth else None
+    path, _, _ = _ida_star_search(start_cube, max_depth, time.time() + timeout, metric)
+    return path
+
+def _ida_star_search(start_cube, max_depth, deadline, metric='qtm', cancel=None, progress=None):
+    """
+    IDA* core. Returns (path or None, nodes expanded, finished); finished is
+    False if the deadline (or the optional `cancel` event) cut the search
+    short, so a None path with finished=True proves there is no solution
+    within max_depth. The optional progress(nodes) is called every 4096 nodes.
+    """
+    half_turns = metric == 'htm'
+    suffix = '_htm' if half_turns else ''
+    moves = ALL_MOVES if half_turns else QUARTER_TURNS
+    twist_move, flip_move = move_table('twist'), move_table('flip')
+    corners_move, edge4_move = move_table('corners'), move_table('slice_sorted')
+    # Packed 4-bit pattern databases, read with packed_entry
+    pdb_corners = pattern_database('corners' + suffix).data
+    pdb_twist = pattern_database('twist_slice' + suffix).data
+    pdb_flip = pattern_database('flip_slice' + suffix).data
+    twist_slice = twist_slice_index()
+
+    solved = CubieCube()
+    u_goal, d_goal = solved.get_edge_group(U_EDGES), solved.get_edge_group(D_EDGES)
+
+    def h(twist, flip, corners, slice_sorted):
+        s = slice_sorted // 24
+        c = packed_entry(pdb_corners, corners)
+        dist = max(c, packed_entry(pdb_twist, twist_slice(twist, s)), packed_entry(pdb_flip, flip * N_SLICE + s))
+        # Every quarter turn flips the corner parity, so a QTM distance has its parity
+        if not half_turns and (dist ^ c) & 1:
+            dist += 1
+        return dist
+
+    path = []
+    nodes = 0
+    next_bound = 0
+
+    def search(twist, flip, corners, ue, de, se, g, bound, last, last2):
+        nonlocal nodes, next_bound
+        if not (twist or flip or corners or se) and ue == u_goal and de == d_goal:
+            return True
+        nodes += 1
+        if not nodes & 4095:
+            if time.time() > deadline or cancel is not None and cancel.is_set():
+                raise _SearchTimeout
+            if progress is not None:
+                progress(nodes)
+        last_face = last // 3 if last is not None else -1
+        for m in moves:
+            face = m // 3
+            if face == last_face:
+                # HTM: never. QTM: only "X X" (a half turn), never "X X'", "X' X'" or "X X X"
+                if half_turns or m != last or m % 3 or m == last2:
+                    continue
+            elif face == (last_face + 3) % 6 and face < last_face:
+                # Opposite faces commute: search them in one order only
+                continue
+            ntwist = twist_move[N_MOVE * twist + m]
+            nflip = flip_move[N_MOVE * flip + m]
+            ncorners = corners_move[N_MOVE * corners + m]
+            nse = edge4_move[N_MOVE * se + m]
+            f = g + 1 + h(ntwist, nflip, ncorners, nse)
+            if f > bound:
+                if f < next_bound:
+                    next_bound = f
+                continue
+            path.append(m)
+            if search(ntwist, nflip, ncorners, edge4_move[N_MOVE * ue + m],
+                      edge4_move[N_MOVE * de + m], nse, g + 1, bound, m, last):
+                return True
+            path.pop()
+        return False
+
+    cubie = CubieCube.from_cube(start_cube)
+    start = (cubie.get_twist(), cubie.get_flip(), cubie.get_corners(),
+             cubie.get_edge_group(U_EDGES), cubie.get_edge_group(D_EDGES), cubie.get_slice_sorted())
+    bound = h(start[0], start[1], start[2], start[5])
+    try:
+        while bound <= max_depth:
+            next_bound = max_depth + 1
+            if search(*start, 0, bound, None, None):
+                return [MOVE_NAMES[m] for m in path], nodes, True
+            bound = next_bound
+    except _SearchTimeout:
+        return None, nodes, False
+    return None, nodes, True
+
+def _trace(visited, state, moves):
+    """Moves leading to `state` in a bidirectional_solve tree (visited: state -> last move index)."""
+    path = []
+    move = visited[state]
+    while move is not None:
+        path.append(moves[move])
+        state = state.apply(inverse_move(moves[move]))
+        move = visited[state]
+    path.reverse()
+    return path
+
+def bidirectional_solve(start_cube, max_depth=14, timeout=30, metric='qtm'):
+    """
+    Meet-in-the-middle search: breadth-first from the scramble and from the
+    solved state, one whole level at a time, always growing the smaller side.
+    - Frontiers are StateBatch buffers (54 bytes per state) and each visited
+      set maps a state to the index of its last move, so paths are rebuilt by
+      walking back instead of being stored.
+    - The first level that meets the other side gives an optimal solution in
+      the chosen metric (every shorter total was ruled out by earlier levels).
+    - Expands roughly the square root of the states a one-sided search needs;
+      memory grows ~10x per level, so ~12-14 quarter turns is the practical limit.
+    """
+    start = CubeState.from_cube(start_cube)
+    verify_state(start)
+    if start.is_solved():
+        return []
+    moves = _metric_moves(metric)
+    n_moves = len(moves)
+    deadline = time.time() + timeout
+    visited = [{start: None}, {SOLVED_STATE: None}]
+    frontiers = [StateBatch(start), StateBatch(SOLVED_STATE)]
+    depths = [0, 0]
+    while depths[0] + depths[1] < max_depth:
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        mine, other = visited[side], visited[1 - side]
+        next_frontier = []
+        for i, child in enumerate(frontiers[side].expand(moves)):
+            if not i & 4095 and time.time() > deadline:
+                return None
+            if child in mine:
+                continue
+            mine[child] = i % n_moves
+            if child in other:
+                forward = _trace(visited[0], child, moves)
+                backward = _trace(visited[1], child, moves)
+                return forward + [inverse_move(move) for move in reversed(backward)]
+            next_frontier.append(child)
+        if not next_frontier:
+            return None
+        frontiers[side] = StateBatch.from_states(next_frontier)
+        depths[side] += 1
+    return None
+
+# One improvement reported by anytime_solve: the moves, seconds since the
+# call, nodes expanded by the search that found it, and whether it is proven
+# optimal (half-turn metric).
+SolveUpdate = namedtuple('SolveUpdate', ['moves', 'elapsed', 'nodes', 'optimal'])
+
+def anytime_solve(start_cube, max_depth=30, timeout=10, prove=True, progress=None):
+    """
+    Generator yielding successively shorter solutions (half-turn metric) as
+    SolveUpdates, so a caller can show a good answer at once and keep
+    refining it until the deadline.
+    - The two-phase search runs in a helper thread and reports each strictly
+      shorter solution (the first one usually within a fraction of a second).
+    - Once it is done, the time left goes to IDA* for anything shorter than
+      the best: it either finds an optimal solution or proves the best one
+      optimal (final update with optimal=True). Skip this with prove=False.
+    - Closing the generator early stops the search; no thread outlives it.
+    - progress(nodes), if given, is called every few thousand nodes with the
+      total expanded so far (from the helper thread during the two-phase part).
+    """
+    prepare_tables()
     start_time = time.time()
+    deadline = start_time + timeout
+    state = CubeState.from_cube(start_cube)
+    verify_state(state)
+    if state.is_solved():
+        yield SolveUpdate([], 0.0, 0, True)
+        return
+    endgame = endgame_table('htm')
+    if endgame is not None:
+        solution = endgame.solve(state)
+        if solution is not None and len(solution) <= max_depth:
+            yield SolveUpdate(solution, time.time() - start_time, 0, True)
+            return
+
+    updates = queue.Queue()
+    cancel = threading.Event()
+
+    def run():
+        try:
+            two_phase_search(CubieCube.from_cube(start_cube), max_depth, deadline,
+                             lambda moves, nodes: updates.put((moves, nodes)), cancel, progress)
+        finally:
+            updates.put(None)
+
+    worker = threading.Thread(target=run, daemon=True)
+    worker.start()
+    best = None
+    nodes = 0
+    try:
+        while True:
+            update = updates.get()
+            if update is None:
+                break
+            best, nodes = update
+            yield SolveUpdate(best, time.time() - start_time, nodes, False)
+    finally:
+        cancel.set()
+        worker.join()
+
+    if not prove or time.time() >= deadline:
+        return
+    limit = max_depth if best is None else len(best) - 1
+    counted = None if progress is None else lambda proof_nodes: progress(nodes + proof_nodes)
+    path, proof_nodes, finished = _ida_star_search(start_cube, limit, deadline, 'htm', progress=counted)
+    if path is not None:
+        yield SolveUpdate(path, time.time() - start_time, nodes + proof_nodes, True)
+    elif finished and best is not None:
+        yield SolveUpdate(best, time.time() - start_time, nodes + proof_nodes, True)
+
+def _moves_fingerprint():
+    return hashlib.sha256(repr(sorted(RubiksCube.MOVE_PERMS.items())).encode()).hexdigest()[:32]
+
+class SolutionCache:
+    """
+    Bounded, thread-safe LRU cache of solutions, keyed by the symmetry class
+    of the state (CubeState.canonical_with_symmetry), the metric and the
+    engine, so a repeated or merely symmetric position is answered without
+    searching, and never with another engine's (e.g. non-optimal) answer.
+    - Solutions are stored in the representative's frame and translated back
+      through SYM_MOVES for each query.
+    - "No solution within depth d" is stored too (when the solver gave up
+      before its timeout, i.e. the search was exhausted), so hopeless repeats
+      with max_depth <= d fail fast.
+    - With `path`, entries are loaded from and saved (save()) to a JSON file,
+      tagged with a fingerprint of the move definitions so solutions cached
+      under other moves are never served.
+    - `hits` / `misses` count lookups; stats() reports them with the size.
+    """
+    VERSION = 2
+
+    def __init__(self, maxsize=4096, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (representative, metric, engine) -> (framed moves or None, depth)
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self._entries)
 
-    def solve_branch(move):
-        if found.is_set():
+    def get(self, state, max_depth=22, metric='qtm', engine=None):
+        """
+        Look up a CubeState among the entries stored for `engine` (a name).
+        Returns (True, solution) on a hit, where the solution is a move list
+        or None (known unsolvable within max_depth), and (False, None) on a miss.
+        """
+        rep, sym = state.canonical_with_symmetry()
+        key = (rep, metric, engine)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                framed, depth = entry
+                if framed is not None and len(framed) <= max_depth:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    real = {f: m for m, f in SYM_MOVES[sym].items()}
+                    return True, [real[move] for move in framed]
+                if framed is None and max_depth <= depth:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, None
+            self.misses += 1
+            return False, None
+
+    def put(self, state, solution, max_depth=22, metric='qtm', engine=None):
+        """Store a solution found by `engine`, or None for "no solution within max_depth"."""
+        rep, sym = state.canonical_with_symmetry()
+        key = (rep, metric, engine)
+        framed = None if solution is None else [SYM_MOVES[sym][move] for move in solution]
+        with self._lock:
+            old = self._entries.get(key)
+            if old is not None:
+                # Keep the more useful entry: any solution beats a failure, shorter beats longer
+                if framed is None and (old[0] is not None or old[1] >= max_depth):
+                    return
+                if framed is not None and old[0] is not None and len(old[0]) <= len(framed):
+                    return
+            self._entries[key] = (framed, max_depth)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def solve(self, start_cube, solver=None, max_depth=22, timeout=10, metric=None, **options):
+        """
+        Cached call of `solver` (default a_star_solve). metric defaults to the
+        solver's own ('htm' for two_phase_solve, else 'qtm'). Entries are
+        kept per solver, so only its own earlier results are served.
+        """
+        solver = solver or a_star_solve
+        if metric is None:
+            metric = 'htm' if solver is two_phase_solve else 'qtm'
+        elif solver is not two_phase_solve:
+            options['metric'] = metric
+        state = CubeState.from_cube(start_cube)
+        engine = solver.__name__
+        hit, solution = self.get(state, max_depth, metric, engine)
+        if hit:
+            return solution
+        start_time = time.time()
+        solution = solver(start_cube, max_depth=max_depth, timeout=timeout, **options)
+        if solution is not None or time.time() - start_time < timeout:
+            self.put(state, solution, max_depth, metric, engine)
+        return solution
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'size': len(self._entries), 'maxsize': self.maxsize, 'hits': self.hits,
+                    'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def save(self, path=None):
+        """Write the entries (least recently used first) atomically as JSON."""
+        path = path or self.path
+        with self._lock:
+            entries = [[rep.hex(), metric, engine, framed, depth]
+                       for (rep, metric, engine), (framed, depth) in self._entries.items()]
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'version': self.VERSION, 'fingerprint': _moves_fingerprint(), 'entries': entries}, f)
+        os.replace(tmp, path)
+
+    def load(self, path=None):
+        """
+        Merge entries from a file written by save(). Unreadable or malformed
+        files, and files saved under other move definitions, are ignored.
+        """
+        try:
+            with open(path or self.path) as f:
+                data = json.load(f)
+            if data.get('version') != self.VERSION or data.get('fingerprint') != _moves_fingerprint():
+                return
+            entries = []
+            for rep, metric, engine, framed, depth in data['entries']:
+                state = CubeState(bytes.fromhex(rep))
+                if (len(state) != 54 or metric not in METRIC_MOVES or not isinstance(depth, int)
+                        or not (engine is None or isinstance(engine, str))):
+                    raise ValueError("malformed cache entry")
+                if framed is not None and not set(framed) <= set(METRIC_MOVES[metric]):
+                    raise ValueError("malformed cache entry")
+                entries.append(((state, metric, engine), (framed, depth)))
+        except (OSError, AttributeError, KeyError, TypeError, ValueError):
             return
-        cube = start_cube.copy()
-        cube.apply_move(move)
-        # ADJUSTED: timeout for this thread = total timeout - time spent so far
-        elapsed = time.time() - start_time
-        thread_timeout = max(1, timeout - elapsed)
-        path = a_star_solve(cube, max_depth=max_depth-1, timeout=thread_timeout)
-        if path is not None:
-            with lock:
-                # Double-check event to avoid race
-                if not found.is_set():
-                    solutions.append([move] + path)
-                    found.set()  # Optionally, you may set this only on "short" solutions
-
-    # Launch all threads
-    for move in MOVES:
-        t = threading.Thread(target=solve_branch, args=(move,))
-        threads.append(t)
-        t.start()
-
-    # Join each thread, but don't wait longer than timeout in total
-    end_time = start_time + timeout
-    for t in threads:
-        remaining = max(0, end_time - time.time())
-        if remaining > 0:
-            t.join(remaining)
-
-    # Filter/return best solution if found
-    if solutions:
-        return min(solutions, key=len)
-    return None
+        with self._lock:
+            self._entries.update(entries)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m solver', description="Rubik's Cube solver utilities.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build-tables', help="Build the pattern-database files used by the solvers.")
+    build.add_argument('--dir', default=None, help=f"Output directory (default: {TABLE_DIR}).")
+    build.add_argument('--force', action='store_true', help="Rebuild even if valid tables exist.")
+    build.add_argument('--endgame-depth', type=int, default=None,
+                       help=f"Depth of the endgame tables for both metrics (default: {ENDGAME_DEPTHS}); 0 skips them.")
+    args = parser.parse_args(argv)
+
+    if args.command == 'build-tables':
+        start_time = time.time()
+        paths = build_tables(args.dir, force=args.force)
+        if args.endgame_depth != 0:
+            depths = args.endgame_depth and {metric: args.endgame_depth for metric in ENDGAME_DEPTHS}
+            for metric, path in build_endgame_tables(args.dir, depths, force=args.force).items():
+                paths[f'endgame_{metric}'] = path
+        for name, path in paths.items():
+            print(f"{name:18s} {os.path.getsize(path):>9d} bytes  {path}")
+        print(f"Tables ready in {time.time() - start_time:.1f}s")
 
-# # Example usage for hackathon demo:
-# if __name__ == "__main__":
-#     cube = RubiksCube()
-#     scramble = ["U", "R", "F", "D", "U'", "L", "B"]
-#     for mv in scramble:
-#         cube.apply_move(mv)
-#     print("Scramble:", scramble)
-#     print("Initial cube:")
-#     print(cube)
-#     sol = parallel_a_star_solve(cube, max_depth=22, timeout=10)
-#     if sol:
-#         print("Solution:", sol)
-#         print("Length:", len(sol))
-#     else:
-#         print("No solution found in given time or depth.")
+if __name__ == "__main__":
+    main()
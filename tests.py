@@ -1,8 +1,25 @@
+import asyncio
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import tempfile
 import unittest
 import time
 import threading
-from cube import RubiksCube
-from solver import a_star_solve
+from cube import (RubiksCube, CubeState, StateBatch, HTM_MOVES, SOLVED_STATE, SYMMETRIES, conjugate_state,
+                  format_facelets, inverse_move, parse_facelets, parse_moves)
+from solver import SearchStats, SolutionCache, anytime_solve, heuristic, a_star_solve, bidirectional_solve, parallel_a_star_solve, ida_star_solve, two_phase_solve, is_redundant
+from cubie import (CubieCube, MOVE_NAMES, MOVE_INDEX, PHASE2_MOVES, N_SLICE, N_TWIST, move_table,
+                   slice_classes, twist_conj_table, verify_state)
+import pruning
+import batch
+import benchmark
+import endgame
+import optimize
+import solver
+import service
 
 
 def apply_moves(cube, moves):
@@ -14,18 +31,9 @@ def a_star_solve_with_timeout(cube, max_depth=12, timeout=5):
     """
     Run a_star_solve with a timeout.
     Returns solution list if found within timeout, else None.
+    a_star_solve stops at its own deadline, so no search is left running.
     """
-    result = [None]
-    def target():
-        # Pass timeout down to solver to limit internal run time as well
-        result[0] = a_star_solve(cube, max_depth=max_depth, timeout=timeout)
-    t = threading.Thread(target=target)
-    t.daemon = True
-    t.start()
-    t.join(timeout)
-    if t.is_alive():
-        return None
-    return result[0]
+    return a_star_solve(cube, max_depth=max_depth, timeout=timeout)
 
 
 class TestRubiksCubeWithTiming(unittest.TestCase):
@@ -77,6 +85,7 @@ class TestRubiksCubeWithTiming(unittest.TestCase):
         Skip any that take too long.
         """
         import random
+        rng = random.Random(2025)  # seeded, so runs are comparable
         moves = ['U', "U'", 'D', "D'", 'F', "F'", 'B', "B'", 'L', "L'", 'R', "R'"]
         num_tests = 10
         max_scramble_length = 6
@@ -85,7 +94,7 @@ class TestRubiksCubeWithTiming(unittest.TestCase):
         solved_count = 0
 
         for i in range(num_tests):
-            scramble = [random.choice(moves) for _ in range(max_scramble_length)]
+            scramble = [rng.choice(moves) for _ in range(max_scramble_length)]
             cube = RubiksCube()
             apply_moves(cube, scramble)
 
@@ -107,5 +116,859 @@ class TestRubiksCubeWithTiming(unittest.TestCase):
             self.fail("No random scrambles solved within timeout — possible solver issue.")
 
 
+class TestMoveTables(unittest.TestCase):
+
+    def test_compiled_moves_match_face_move(self):
+        """Every compiled permutation must match the sticker-by-sticker reference move."""
+        for face in 'URFDLB':
+            for move, prime in ((face, False), (face + "'", True)):
+                with self.subTest(move=move):
+                    reference = RubiksCube(list(range(54)))
+                    reference._face_move(face, prime=prime)
+                    cube = RubiksCube(list(range(54)))
+                    cube.apply_move(move)
+                    self.assertEqual(cube.state, reference.state)
+
+    def test_half_turn_and_inverse(self):
+        """X2 equals X X, and X X' is the identity."""
+        for face in 'URFDLB':
+            cube = RubiksCube(list(range(54)))
+            cube.apply_move(face)
+            cube.apply_move(face)
+            half = RubiksCube(list(range(54)))
+            half.apply_move(face + '2')
+            self.assertEqual(cube.state, half.state)
+            cube = RubiksCube()
+            cube.apply_move(face)
+            cube.apply_move(face + "'")
+            self.assertTrue(cube.is_solved())
+
+    def test_bad_move_notation(self):
+        with self.assertRaises(ValueError):
+            RubiksCube().apply_move("U3")
+
+
+class TestCubeState(unittest.TestCase):
+
+    def test_matches_rubiks_cube(self):
+        scramble = ['U', "R'", 'F', 'L', "D'", 'B']
+        cube = RubiksCube()
+        state = CubeState.solved()
+        for move in scramble:
+            cube.apply_move(move)
+            state = state.apply(move)
+        self.assertEqual(list(state), cube.state)
+        self.assertEqual(state, CubeState.from_cube(cube))
+        self.assertEqual(state.to_cube().state, cube.state)
+        self.assertFalse(state.is_solved())
+
+    def test_hashable_set_key(self):
+        a = CubeState.solved().apply('U').apply("U'")
+        self.assertTrue(a.is_solved())
+        visited = {CubeState.solved()}
+        self.assertIn(a, visited)
+        self.assertEqual(len(bytes(a)), 54)
+
+
+class TestCubieCube(unittest.TestCase):
+
+    def _scrambled(self, moves):
+        cube, cubie = RubiksCube(), CubieCube()
+        for move in moves:
+            cube.apply_move(move)
+            cubie.apply_move(move)
+        return cube, cubie
+
+    def test_basic_moves_match_kociemba(self):
+        r = CubieCube()
+        r.apply_move('R')
+        self.assertEqual(r.cp, [4, 1, 2, 0, 7, 5, 6, 3])
+        self.assertEqual(r.co, [2, 0, 0, 1, 1, 0, 0, 2])
+        self.assertEqual(r.ep, [8, 1, 2, 3, 11, 5, 6, 7, 4, 9, 10, 0])
+        f = CubieCube()
+        f.apply_move('F')
+        self.assertEqual(f.eo, [0, 1, 0, 0, 0, 1, 0, 0, 1, 1, 0, 0])
+
+    def test_facelet_round_trip(self):
+        cube, cubie = self._scrambled(['U', "R'", 'F2', 'L', "D'", 'B', 'R', 'U2', "F'"])
+        self.assertEqual(CubieCube.from_cube(cube), cubie)
+        self.assertEqual(cubie.to_facelets(), cube.state)
+        self.assertEqual(CubieCube.from_facelets(CubeState.from_cube(cube)), cubie)
+        self.assertEqual(cubie.corner_parity(), cubie.edge_parity())
+
+    def test_coordinates_round_trip(self):
+        _, cubie = self._scrambled(['R', 'U', "F'", 'L2', 'D', "B'", 'U', 'R2'])
+        for name in ['twist', 'flip', 'slice', 'slice_sorted', 'corners', 'edges']:
+            with self.subTest(coord=name):
+                value = getattr(cubie, 'get_' + name)()
+                other = CubieCube()
+                getattr(other, 'set_' + name)(value)
+                self.assertEqual(getattr(other, 'get_' + name)(), value)
+        solved = CubieCube()
+        self.assertEqual([solved.get_twist(), solved.get_flip(), solved.get_slice_sorted(),
+                          solved.get_corners(), solved.get_ud_edges()], [0, 0, 0, 0, 0])
+
+    def test_move_tables(self):
+        _, cubie = self._scrambled(['F', 'R', "U'", 'B2', 'L', "D'", 'F2'])
+        for name in ['twist', 'flip', 'slice', 'slice_sorted', 'corners']:
+            table = move_table(name)
+            for m, move in enumerate(MOVE_NAMES):
+                with self.subTest(coord=name, move=move):
+                    moved = cubie.copy()
+                    moved.apply_move(move)
+                    value = getattr(cubie, 'get_' + name)()
+                    self.assertEqual(table[18 * value + m], getattr(moved, 'get_' + name)())
+        _, g1 = self._scrambled(['U', 'R2', "D'", 'F2', 'U2', 'L2', 'B2'])
+        table = move_table('ud_edges')
+        for m in PHASE2_MOVES:
+            moved = g1.copy()
+            moved.apply_move(MOVE_NAMES[m])
+            self.assertEqual(table[18 * g1.get_ud_edges() + m], moved.get_ud_edges())
+        self.assertEqual(MOVE_INDEX["U'"], 2)
+
+
+class TestIdaStar(unittest.TestCase):
+
+    def test_solved_cube(self):
+        self.assertEqual(ida_star_solve(RubiksCube()), [])
+
+    def test_optimal_known_scrambles(self):
+        """IDA* solutions are optimal, so never longer than the scramble."""
+        scrambles = [
+            ['U', "R'", 'F'],
+            ['D', 'B', 'L', 'F', 'R', 'U'],
+            ['R', 'U', "R'", "U'", 'F', 'L', "D'", 'B', 'B', "L'"],
+        ]
+        for scramble in scrambles:
+            with self.subTest(scramble=scramble):
+                cube = RubiksCube()
+                apply_moves(cube, scramble)
+                solution = ida_star_solve(cube, max_depth=12, timeout=20)
+                self.assertIsNotNone(solution)
+                self.assertLessEqual(len(solution), len(scramble))
+                apply_moves(cube, solution)
+                self.assertTrue(cube.is_solved())
+
+    def test_half_turn_needs_two_quarter_turns(self):
+        cube = RubiksCube()
+        apply_moves(cube, ['U', 'U'])
+        # Either direction is optimal (the endgame table, if built, answers U' U')
+        self.assertIn(ida_star_solve(cube), (['U', 'U'], ["U'", "U'"]))
+
+    def test_depth_limit(self):
+        cube = RubiksCube()
+        apply_moves(cube, ['U', "R'", 'F', 'L'])
+        self.assertIsNone(ida_star_solve(cube, max_depth=2))
+
+
+class TestPatternDatabaseFiles(unittest.TestCase):
+
+    def test_build_load_and_lookup(self):
+        with tempfile.TemporaryDirectory() as directory:
+            pruning.build_table('corners', directory)
+            pdb = pruning.load_table('corners', directory)
+            self.assertIsNotNone(pdb)
+            self.assertEqual(len(pdb), 40320)
+            self.assertEqual(pdb[0], 0)
+            r = CubieCube()
+            r.apply_move('R')
+            self.assertEqual(pdb[r.get_corners()], 1)
+            self.assertEqual(max(pdb[i] for i in range(len(pdb))), 8)
+
+    def test_corrupt_table_is_rebuilt(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = pruning.build_table('corners', directory)
+            with open(path, 'r+b') as f:
+                f.seek(-1, os.SEEK_END)
+                last = f.read(1)
+                f.seek(-1, os.SEEK_END)
+                f.write(bytes([last[0] ^ 0xFF]))
+            self.assertIsNone(pruning.load_table('corners', directory))
+            pdb = pruning.pattern_database('corners', directory)
+            self.assertEqual(pdb[0], 0)
+            self.assertIsNotNone(pruning.load_table('corners', directory))
+
+    def test_version_mismatch_is_stale(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = pruning.build_table('corners', directory)
+            with open(path, 'r+b') as f:
+                f.seek(4)
+                f.write((pruning.TABLE_VERSION + 1).to_bytes(2, 'little'))
+            self.assertIsNone(pruning.load_table('corners', directory))
+
+
+class TestEndgameTable(unittest.TestCase):
+
+    def test_table_walk_is_optimal(self):
+        with tempfile.TemporaryDirectory() as directory:
+            endgame.build_table('qtm', 4, directory)
+            table = endgame.load_table('qtm', 4, directory)
+            self.assertEqual(len(table), 1 + 12 + 114 + 1068 + 10011)
+            self.assertEqual(table.solve(CubeState.solved()), [])
+            for scramble in (['R'], ['U', 'U'], ['F', "R'", 'D'], ['L', 'B', "U'", 'R']):
+                state = CubeState.solved()
+                for move in scramble:
+                    state = state.apply(move)
+                cube = state.to_cube()
+                solution = table.solve(state)
+                self.assertEqual(len(solution), len(bidirectional_solve(cube)))
+                apply_moves(cube, solution)
+                self.assertTrue(cube.is_solved())
+            deeper = CubeState.solved()
+            for move in ['R', 'U', 'F', 'L', 'D']:
+                deeper = deeper.apply(move)
+            self.assertIsNone(table.solve(deeper))
+            self.assertNotIn(deeper, table)
+
+    def test_deepest_table_on_disk_and_corruption(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertIsNone(endgame.endgame_table('htm', directory=directory))
+            endgame.build_table('htm', 1, directory)
+            path = endgame.build_table('htm', 2, directory)
+            self.assertEqual(endgame.endgame_table('htm', directory=directory).depth, 2)
+            with open(path, 'r+b') as f:
+                f.seek(-1, os.SEEK_END)
+                last = f.read(1)
+                f.seek(-1, os.SEEK_END)
+                f.write(bytes([last[0] ^ 0xFF]))
+            self.assertIsNone(endgame.load_table('htm', 2, directory))
+
+
+class TestTwoPhase(unittest.TestCase):
+
+    def test_solved_and_short(self):
+        self.assertEqual(two_phase_solve(RubiksCube()), [])
+        cube = RubiksCube()
+        apply_moves(cube, ['U', 'R2', "F'"])
+        self.assertEqual(two_phase_solve(cube, timeout=5), ['F', 'R2', "U'"])
+
+    def test_deep_random_scrambles(self):
+        """Arbitrary states get a solution within a few seconds, at most ~22 moves after refining."""
+        import random
+        rng = random.Random(2025)
+        for _ in range(3):
+            scramble = [rng.choice(MOVE_NAMES) for _ in range(30)]
+            cube = RubiksCube()
+            apply_moves(cube, scramble)
+            solution = two_phase_solve(cube, timeout=3, target_length=22)
+            self.assertIsNotNone(solution, f"No solution for {scramble}")
+            self.assertLessEqual(len(solution), 30)
+            apply_moves(cube, solution)
+            self.assertTrue(cube.is_solved())
+
+
+class TestHalfTurnMetric(unittest.TestCase):
+
+    def test_inverse_move(self):
+        for move in HTM_MOVES:
+            cube = RubiksCube()
+            cube.apply_move(move)
+            cube.apply_move(inverse_move(move))
+            self.assertTrue(cube.is_solved(), move)
+
+    def test_move_pruning(self):
+        self.assertFalse(is_redundant('U', ['U']))
+        self.assertTrue(is_redundant('U', ['U', 'U']))
+        self.assertTrue(is_redundant("U'", ['U']))
+        self.assertTrue(is_redundant("U'", ["U'"]))
+        self.assertTrue(is_redundant('U2', ['U'], metric='htm'))
+        self.assertFalse(is_redundant('D', ['U'], metric='htm'))
+
+    def test_a_star_half_turns(self):
+        cube = RubiksCube()
+        apply_moves(cube, ['R', 'R', 'U'])
+        self.assertEqual(len(a_star_solve(cube, max_depth=6, timeout=5)), 3)
+        self.assertEqual(a_star_solve(cube, max_depth=6, timeout=5, metric='htm'), ["U'", 'R2'])
+
+    def test_ida_star_htm(self):
+        scramble = ['R2', 'U', 'F2', "L'", 'D2', 'B', "U'", 'R2']
+        cube = RubiksCube()
+        apply_moves(cube, scramble)
+        solution = ida_star_solve(cube, timeout=20, metric='htm')
+        self.assertIsNotNone(solution)
+        self.assertLessEqual(len(solution), len(scramble))
+        apply_moves(cube, solution)
+        self.assertTrue(cube.is_solved())
+
+    def test_unknown_metric(self):
+        cube = RubiksCube()
+        cube.apply_move('U')
+        with self.assertRaises(ValueError):
+            a_star_solve(cube, metric='stm')
+
+
+class TestSymmetry(unittest.TestCase):
+
+    def test_conjugates_share_canonical_state(self):
+        state = CubeState.solved()
+        for move in ['R', 'U', "F'", 'L2', 'D']:
+            state = state.apply(move)
+        conjugates = {conjugate_state(state, s) for s in range(len(SYMMETRIES))}
+        self.assertEqual(len(conjugates), 48)
+        keys = {CubeState(c).canonical() for c in conjugates}
+        self.assertEqual(keys, {state.canonical()})
+        self.assertEqual(CubeState.solved().canonical(), CubeState.solved())
+
+    def test_a_star_with_symmetry(self):
+        cube = RubiksCube()
+        apply_moves(cube, ['R', 'U', "F'", 'L', 'D'])
+        solution = a_star_solve(cube, max_depth=8, timeout=10, symmetry=True)
+        self.assertIsNotNone(solution)
+        self.assertLessEqual(len(solution), 5)
+        apply_moves(cube, solution)
+        self.assertTrue(cube.is_solved())
+
+    def test_sym_reduced_twist_slice_table(self):
+        (coord_a, n_a), (coord_b, n_b), moves = pruning.PDB_SPECS['twist_slice_htm']
+        full = pruning._build_pdb(coord_a, n_a, coord_b, n_b, moves)
+        reduced = pruning.pattern_database('twist_slice_htm')
+        self.assertEqual(len(reduced), 45 * N_TWIST)
+        twist_conj = twist_conj_table()
+        slice_class, slice_sym, _ = slice_classes()
+        index = pruning.twist_slice_index()
+        for twist in range(0, N_TWIST, 37):
+            for slc in range(0, N_SLICE, 11):
+                i = slice_class[slc] * N_TWIST + twist_conj[16 * twist + slice_sym[slc]]
+                self.assertEqual(index(twist, slc), i)
+                self.assertEqual(pruning.packed_entry(reduced.data, i), full[twist * N_SLICE + slc])
+
+
+class TestParallelAStar(unittest.TestCase):
+
+    def test_solves_and_leaves_no_workers(self):
+        threads = threading.active_count()
+        for scramble in (['U', "R'", 'F', 'L'], ['D', 'B', 'L', 'F', 'R', 'U']):
+            with self.subTest(scramble=scramble):
+                cube = RubiksCube()
+                apply_moves(cube, scramble)
+                solution = parallel_a_star_solve(cube, max_depth=12, timeout=20, workers=2)
+                self.assertIsNotNone(solution)
+                apply_moves(cube, solution)
+                self.assertTrue(cube.is_solved())
+        self.assertEqual(multiprocessing.active_children(), [])
+        self.assertEqual(threading.active_count(), threads)
+
+    def test_short_scramble_inside_prefix(self):
+        cube = RubiksCube()
+        cube.apply_move('R')
+        self.assertEqual(parallel_a_star_solve(cube, timeout=5, prefix_depth=3), ["R'"])
+
+    def test_exhaustive_bound(self):
+        cube = RubiksCube()
+        apply_moves(cube, ['U', 'R', "F'", 'L', 'D'])
+        solution = parallel_a_star_solve(cube, max_depth=8, timeout=30, workers=2, exhaustive=True)
+        self.assertIsNotNone(solution)
+        self.assertLessEqual(len(solution), 5)
+        apply_moves(cube, solution)
+        self.assertTrue(cube.is_solved())
+
+
+class TestBatch(unittest.TestCase):
+
+    def test_read_scrambles(self):
+        stream = io.StringIO("R U F'\n\n# comment\n"
+                             '{"id": "a", "scramble": "R2 D"}\n'
+                             '{"scramble": ["L", "B"]}\n')
+        self.assertEqual(list(batch.read_scrambles(stream)),
+                         [(1, "R U F'"), ('a', 'R2 D'), (5, 'L B')])
+
+    def test_bad_lines_do_not_stop_batch(self):
+        stream = io.StringIO('R U\n{"id": 2}\n{not json\n{"scramble": ["R", 3]}\nL D\n')
+        results = {r['id']: r for r in batch.solve_batch(batch.read_scrambles(stream), workers=1,
+                                                          timeout=5, target_length=20)}
+        self.assertEqual(set(results), {1, 2, 3, 4, 5})
+        self.assertEqual(results[2]['error'], "missing 'scramble'")
+        self.assertIn('error', results[3])
+        self.assertIn('error', results[4])
+        self.assertIsNotNone(results[5]['solution'])
+
+    def test_solve_batch_streams_all_results(self):
+        scrambles = [(1, "R U F'"), (2, "D2 L' B R2"), (3, 'R Q'), (4, '')]
+        results = {r['id']: r for r in batch.solve_batch(scrambles, workers=2, timeout=5, target_length=20)}
+        self.assertEqual(set(results), {1, 2, 3, 4})
+        self.assertIn('error', results[3])
+        self.assertEqual(results[4]['solution'], '')
+        for scramble_id in (1, 2):
+            cube = RubiksCube()
+            apply_moves(cube, results[scramble_id]['scramble'].split())
+            apply_moves(cube, results[scramble_id]['solution'].split())
+            self.assertTrue(cube.is_solved())
+        summary = batch.summarize(list(results.values()), 1.0)
+        self.assertEqual((summary['solved'], summary['errors']), (3, 1))
+        self.assertLessEqual(summary['p50_seconds'], summary['p99_seconds'])
+
+    def test_engine_options_checked(self):
+        with self.assertRaisesRegex(ValueError, 'target_length'):
+            list(batch.solve_batch([(1, 'R')], engine='ida', target_length=20))
+        with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+            batch.main(['--engine', 'a_star', '--target-length', '20', os.devnull])
+        # A solver error becomes that scramble's error record; the rest of the batch still runs
+        results = {r['id']: r for r in batch.solve_batch([(1, 'R'), (2, 'U')], engine='ida', workers=1,
+                                                          timeout=5, metric='stm')}
+        self.assertEqual(set(results), {1, 2})
+        self.assertTrue(all('error' in r for r in results.values()))
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(batch.percentile(values, 50), 50)
+        self.assertEqual(batch.percentile(values, 99), 99)
+        self.assertEqual(batch.percentile([3.0], 99), 3.0)
+
+
+class TestStateBatch(unittest.TestCase):
+
+    def setUp(self):
+        import random
+        rng = random.Random(7)
+        self.states = []
+        for _ in range(300):
+            state = CubeState.solved()
+            for _ in range(rng.randrange(12)):
+                state = state.apply(rng.choice(HTM_MOVES))
+            self.states.append(state)
+
+    def test_expand_matches_single_moves(self):
+        batch = StateBatch.from_states(self.states)
+        children = batch.expand(HTM_MOVES)
+        self.assertEqual(len(children), len(self.states) * len(HTM_MOVES))
+        self.assertEqual(list(children), [s.apply(m) for s in self.states for m in HTM_MOVES])
+        self.assertEqual(list(batch.apply("R'")), [s.apply("R'") for s in self.states])
+        self.assertEqual(list(StateBatch.from_states(self.states[:1]).expand(['U'])), [self.states[0].apply('U')])
+
+    def test_misplaced_matches_heuristic(self):
+        batch = StateBatch.from_states(self.states)
+        counts = [sum(1 for i in range(54) if s[i] != i // 9) for s in self.states]
+        self.assertEqual(batch.misplaced(), counts)
+        self.assertEqual([heuristic(s) for s in self.states], [c // 8 for c in counts])
+        self.assertEqual([heuristic(s.to_cube()) for s in self.states], [c // 8 for c in counts])
+        self.assertEqual(batch.solved_mask(), [s.is_solved() for s in self.states])
+        self.assertEqual(StateBatch().misplaced(), [])
+
+
+class TestBidirectional(unittest.TestCase):
+
+    def test_optimal_like_ida_star(self):
+        for scramble, metric in ((['R', 'U', "F'", 'L', 'D', 'B', "R'", 'U'], 'qtm'),
+                                 (['R2', 'U', "F'", 'L2', 'D', "B'", 'R'], 'htm')):
+            with self.subTest(metric=metric):
+                cube = RubiksCube()
+                apply_moves(cube, scramble)
+                solution = bidirectional_solve(cube, timeout=30, metric=metric)
+                self.assertEqual(len(solution), len(ida_star_solve(cube, timeout=30, metric=metric)))
+                apply_moves(cube, solution)
+                self.assertTrue(cube.is_solved())
+
+    def test_trivial_and_depth_limit(self):
+        self.assertEqual(bidirectional_solve(RubiksCube()), [])
+        cube = RubiksCube()
+        cube.apply_move('F')
+        self.assertEqual(bidirectional_solve(cube), ["F'"])
+        apply_moves(cube, ['R', 'U', 'L'])
+        self.assertIsNone(bidirectional_solve(cube, max_depth=3))
+
+
+class TestSolutionCache(unittest.TestCase):
+
+    def test_symmetric_hit(self):
+        cache = SolutionCache()
+        cube = RubiksCube()
+        apply_moves(cube, ['R', 'U', "F'"])
+        solution = cache.solve(cube, max_depth=8, timeout=5)
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        # The mirror image of the scramble (R <-> L') is in the same symmetry class
+        mirrored = RubiksCube()
+        apply_moves(mirrored, ["L'", "U'", 'F'])
+        again = cache.solve(mirrored, max_depth=8, timeout=5)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(len(again), len(solution))
+        apply_moves(mirrored, again)
+        self.assertTrue(mirrored.is_solved())
+
+    def test_negative_results_and_depth(self):
+        cache = SolutionCache()
+        cube = RubiksCube()
+        apply_moves(cube, ['R', 'U', 'F', 'L'])
+        state = CubeState.from_cube(cube)
+        self.assertIsNone(cache.solve(cube, ida_star_solve, max_depth=2, timeout=5))
+        self.assertEqual(cache.get(state, max_depth=2, engine='ida_star_solve'), (True, None))
+        self.assertEqual(cache.get(state, max_depth=3, engine='ida_star_solve'), (False, None))
+        self.assertEqual(len(cache.solve(cube, ida_star_solve, max_depth=6, timeout=5)), 4)
+        self.assertTrue(cache.get(state, max_depth=4, engine='ida_star_solve')[0])
+
+    def test_entries_per_engine(self):
+        cache = SolutionCache()
+        cube = RubiksCube()
+        apply_moves(cube, ['R', 'U'])
+        state = CubeState.from_cube(cube)
+        # A longer answer from another engine, and a failure stored by a third, are not served for IDA*
+        cache.put(state, ["U'", 'R', 'R', 'R', 'R', "R'"], max_depth=8, metric='htm', engine='two_phase_solve')
+        cache.put(state, None, max_depth=8, metric='htm', engine='bidirectional_solve')
+        self.assertEqual(cache.solve(cube, ida_star_solve, max_depth=8, timeout=5, metric='htm'), ["U'", "R'"])
+        self.assertEqual(cache.get(state, 8, 'htm', 'two_phase_solve')[1], ["U'", 'R', 'R', 'R', 'R', "R'"])
+
+    def test_lru_eviction_and_persistence(self):
+        # Three different symmetry classes: a quarter turn, a half turn, two faces
+        scrambles = [['R'], ['R2'], ['R', 'U']]
+        states = []
+        for scramble in scrambles:
+            cube = RubiksCube()
+            apply_moves(cube, scramble)
+            states.append(CubeState.from_cube(cube))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.json')
+            cache = SolutionCache(maxsize=2, path=path)
+            cache.put(states[0], ["R'"])
+            cache.put(states[1], ['R2'])
+            cache.get(states[0])
+            cache.put(states[2], ["U'", "R'"])
+            self.assertEqual(len(cache), 2)
+            self.assertFalse(cache.get(states[1])[0])
+            cache.save()
+            loaded = SolutionCache(path=path)
+            self.assertEqual(loaded.get(states[0]), (True, ["R'"]))
+            self.assertEqual(loaded.get(states[2]), (True, ["U'", "R'"]))
+            self.assertEqual(loaded.stats()['hits'], 2)
+
+    def test_corrupt_or_stale_files_ignored(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.json')
+            cache = SolutionCache(path=path)
+            cache.put(SOLVED_STATE.apply('R'), ["R'"])
+            cache.save()
+            with open(path) as f:
+                saved = json.load(f)
+            fingerprint, entry = saved['fingerprint'], saved['entries'][0]
+            bad_files = ['{"version": 1}', '[1, 2]', 'not json',
+                         json.dumps(dict(saved, fingerprint='0' * 32)),  # saved under other move definitions
+                         json.dumps(dict(saved, entries=[['zz'] + entry[1:]])),
+                         json.dumps(dict(saved, entries=[entry[:3]])),
+                         json.dumps(dict(saved, entries=[entry[:3] + [['X'], 1]]))]
+            for text in bad_files:
+                with self.subTest(text=text[:40]):
+                    with open(path, 'w') as f:
+                        f.write(text)
+                    self.assertEqual(len(SolutionCache(path=path)), 0)
+            with open(path, 'w') as f:
+                json.dump(dict(saved, fingerprint=fingerprint), f)
+            self.assertEqual(len(SolutionCache(path=path)), 1)
+
+
+class TestAnytimeSolve(unittest.TestCase):
+
+    def test_improving_then_proven_optimal(self):
+        cube = RubiksCube()
+        apply_moves(cube, ['R2', 'U', "F'", 'L', 'D2', "B'", 'R'])
+        updates = list(anytime_solve(cube, timeout=30))
+        lengths = [len(u.moves) for u in updates if not u.optimal]
+        self.assertEqual(lengths, sorted(set(lengths), reverse=True))
+        final = updates[-1]
+        self.assertTrue(final.optimal)
+        self.assertLessEqual(len(final.moves), 7)
+        self.assertTrue(all(u.nodes >= 0 and u.elapsed >= 0 for u in updates))
+        apply_moves(cube, final.moves)
+        self.assertTrue(cube.is_solved())
+
+    def test_close_stops_search(self):
+        import random
+        rng = random.Random(11)
+        cube = RubiksCube()
+        apply_moves(cube, [rng.choice(HTM_MOVES) for _ in range(30)])
+        threads = threading.active_count()
+        updates = anytime_solve(cube, timeout=30)
+        first = next(updates)
+        self.assertFalse(first.optimal)
+        updates.close()
+        self.assertEqual(threading.active_count(), threads)
+
+    def test_progress_callback(self):
+        import random
+        rng = random.Random(11)
+        cube = RubiksCube()
+        apply_moves(cube, [rng.choice(HTM_MOVES) for _ in range(30)])
+        counts = []
+        list(anytime_solve(cube, timeout=1, prove=False, progress=counts.append))
+        self.assertTrue(counts)
+        self.assertEqual(counts, sorted(counts))
+
+    def test_gui_worker_messages(self):
+        import queue
+        from gui import _solve_worker
+        out = queue.Queue()
+        _solve_worker(bytes(SOLVED_STATE.apply_moves(['R', 'U'])), 2, out)
+        kinds = []
+        while not out.empty():
+            kinds.append(out.get()[0])
+        self.assertEqual((kinds[0], kinds[-1]), ('update', 'done'))
+        twisted = bytearray(SOLVED_STATE)
+        twisted[8], twisted[9], twisted[20] = 1, 2, 0
+        out = queue.Queue()
+        _solve_worker(bytes(twisted), 2, out)
+        self.assertEqual([out.get()[0], out.get()[0]], ['error', 'done'])
+
+
+class TestSolveService(unittest.TestCase):
+
+    def run_service(self, scenario, **options):
+        async def main():
+            async with service.SolveService(**options) as svc:
+                return await scenario(svc)
+        return asyncio.run(main())
+
+    def test_solve(self):
+        async def scenario(svc):
+            return await svc.solve("R U F' L2", target_length=20)
+        result = self.run_service(scenario, workers=1)
+        cube = RubiksCube()
+        apply_moves(cube, ['R', 'U', "F'", 'L2'] + result['solution'])
+        self.assertTrue(cube.is_solved())
+        self.assertEqual(result['length'], len(result['solution']))
+
+    def test_bad_scramble(self):
+        async def scenario(svc):
+            with self.assertRaises(ValueError):
+                await svc.solve("R X")
+        self.run_service(scenario, workers=1)
+
+    def test_bad_options_keep_worker(self):
+        async def scenario(svc):
+            with self.assertRaisesRegex(ValueError, 'target_length'):
+                await svc.solve("R U", target_length=20)  # not an ida option: rejected up front
+            with self.assertRaisesRegex(ValueError, 'stm'):
+                await svc.solve("R U", metric='stm')  # raised by the solver, sent back by the worker
+            return await svc.solve("R U", metric='htm'), svc.stats()
+        result, stats = self.run_service(scenario, engine='ida', workers=1)
+        self.assertEqual(result['length'], 2)
+        self.assertEqual((stats['failed'], stats['restarts']), (1, 0))
+
+    def test_http_bad_bodies_answer_400(self):
+        bodies = [b'[1,2]', b'{"scramble": ["R", 3]}', b'{"scramble": "R U", "timeout": "abc"}',
+                  b'not json', b'{"scramble": "R X"}', b'{"scramble": "R", "metric": "qtm"}']
+
+        async def post(port, body):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b'POST /solve HTTP/1.1\r\nContent-Length: %d\r\n\r\n' % len(body) + body)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            return response
+
+        async def scenario(svc):
+            server = await asyncio.start_server(lambda r, w: service._handle(svc, r, w), '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                return [await post(port, body) for body in bodies]
+        for body, response in zip(bodies, self.run_service(scenario, workers=1)):
+            with self.subTest(body=body):
+                self.assertTrue(response.startswith(b'HTTP/1.1 400 '), response)
+
+    def test_backpressure_and_queued_deadline(self):
+        async def scenario(svc):
+            hard = "R U F' L2 D B R2 U' F L D2 B'"
+            running = asyncio.create_task(svc.solve(hard, timeout=1))
+            await asyncio.sleep(0.2)
+            queued = asyncio.create_task(svc.solve("R U", timeout=0.5))
+            await asyncio.sleep(0)
+            with self.assertRaises(service.ServiceBusy):
+                await svc.solve("R")
+            results = await asyncio.gather(running, queued, return_exceptions=True)
+            return results, svc.stats()
+        (running, queued), stats = self.run_service(scenario, workers=1, queue_size=1)
+        self.assertIsInstance(queued, service.DeadlineExceeded)
+        self.assertEqual((stats['rejected'], stats['expired']), (1, 1))
+
+    def test_cancel_kills_running_search(self):
+        async def scenario(svc):
+            task = asyncio.create_task(svc.solve("R U F' L2 D B R2 U' F L D2 B'", timeout=30))
+            await asyncio.sleep(0.5)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            # The replacement worker answers new requests
+            result = await svc.solve("R U", target_length=2)
+            return result, svc.stats()
+        result, stats = self.run_service(scenario, workers=1)
+        self.assertEqual(result['length'], 2)
+        self.assertEqual((stats['cancelled'], stats['restarts']), (1, 1))
+        self.assertEqual(multiprocessing.active_children(), [])
+
+
+class TestSearchStats(unittest.TestCase):
+
+    def scrambled_state(self, moves):
+        cube = RubiksCube()
+        apply_moves(cube, moves)
+        return CubeState.from_cube(cube)
+
+    def test_counters_match_search(self):
+        # Search the core directly, so an endgame table on disk cannot answer first
+        state = self.scrambled_state(['R', 'U', "F'", 'L'])
+        plain, plain_nodes = solver._a_star_search(state, 10, time.time() + 30)
+        reports = []
+        stats = SearchStats(callback=lambda s: reports.append(s.expanded), interval=1)
+        path, nodes = solver._a_star_search(state, 10, time.time() + 30, stats=stats)
+        self.assertEqual((path, nodes), (plain, plain_nodes))
+        self.assertEqual(stats.outcome, 'solved')
+        self.assertEqual(stats.expanded, nodes - 1)
+        self.assertEqual(stats.generated, stats.duplicates + stats.peak_visited - 1)
+        self.assertEqual(sum(stats.h_counts.values()), stats.peak_visited - 1)
+        self.assertGreater(stats.peak_open, 0)
+        self.assertGreater(stats.branching_factor, 1)
+        self.assertEqual(reports, list(range(1, stats.expanded + 1)) + [stats.expanded])
+        self.assertEqual(set(stats.as_dict()), {
+            'outcome', 'generated', 'expanded', 'duplicates', 'depth_pruned', 'peak_open', 'peak_visited',
+            'h_counts', 'elapsed', 'nodes_per_sec', 'branching_factor', 'move_time', 'heuristic_time',
+            'bookkeeping_time'})
+
+    def test_outcomes(self):
+        state = self.scrambled_state(['R', 'U', "F'", 'L', 'D2', 'B'])
+        stats = SearchStats()
+        self.assertIsNone(solver._a_star_search(state, 2, time.time() + 30, stats=stats)[0])
+        self.assertEqual(stats.outcome, 'exhausted')
+        self.assertGreater(stats.depth_pruned, 0)
+        stats = SearchStats()
+        self.assertIsNone(solver._a_star_search(state, 20, time.time() - 1, stats=stats)[0])
+        self.assertEqual(stats.outcome, 'timeout')
+        stats = SearchStats()
+        self.assertEqual(a_star_solve(RubiksCube(), stats=stats), [])
+        self.assertEqual(stats.outcome, 'solved')
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_corpus_is_seeded(self):
+        for depth in (1, 7, 20):
+            scrambles = benchmark.corpus(depth, count=4)
+            self.assertEqual(scrambles, benchmark.corpus(depth, count=4))
+            self.assertNotEqual(scrambles, benchmark.corpus(depth, count=4, seed=1))
+            for scramble in scrambles:
+                self.assertEqual(len(scramble), depth)
+                self.assertFalse(any(is_redundant(m, scramble[:i]) for i, m in enumerate(scramble)))
+
+    def test_solver_rows_are_json(self):
+        import json
+        results = benchmark.bench_solvers(['ida'], depths=[3], count=2, timeout=5)
+        row = json.loads(json.dumps(results))['ida']['3']
+        self.assertEqual((row['scrambles'], row['solved']), (2, 2))
+        self.assertLessEqual(row['mean_length'], 3)
+
+    def test_parallel_and_anytime_are_benchmarked(self):
+        results = benchmark.bench_solvers(['parallel_a_star', 'anytime'], depths=[4], count=2, timeout=5)
+        for engine in ('parallel_a_star', 'anytime'):
+            self.assertEqual(results[engine][4]['solved'], 2)
+
+
+class TestValidation(unittest.TestCase):
+
+    def scrambled(self):
+        return SOLVED_STATE.apply_moves(parse_moves("R U2 F' L D2 B R' U F2 D'"))
+
+    def assertInvalid(self, state, message):
+        with self.assertRaisesRegex(ValueError, message):
+            verify_state(state)
+
+    def test_reachable_states_pass(self):
+        state = self.scrambled()
+        self.assertEqual(verify_state(state).to_facelets(), list(state))
+        self.assertTrue(verify_state(SOLVED_STATE).is_solved())
+
+    def test_invariants(self):
+        state = bytearray(self.scrambled())
+        twisted = bytearray(state)
+        twisted[8], twisted[9], twisted[20] = state[9], state[20], state[8]  # turn the URF corner in place
+        self.assertInvalid(twisted, 'twisted')
+        flipped = bytearray(state)
+        flipped[5], flipped[10] = state[10], state[5]  # flip the UR edge
+        self.assertInvalid(flipped, 'flipped')
+        swapped = bytearray(state)
+        swapped[5], swapped[10], swapped[7], swapped[19] = state[7], state[19], state[5], state[10]  # UR <-> UF
+        self.assertInvalid(swapped, 'Parity')
+        duplicate = bytearray(SOLVED_STATE)
+        duplicate[5], duplicate[10] = 0, 2  # UR slot shows the UF edge ...
+        duplicate[28], duplicate[25] = 3, 1  # ... and DF the DR edge: colour counts still balance
+        self.assertInvalid(duplicate, 'appears twice')
+        self.assertInvalid(bytes(53), '54 stickers')
+        self.assertInvalid(bytes(54), 'Centre')
+        self.assertInvalid(list(SOLVED_STATE[:-1]) + [256], 'integers')
+        self.assertInvalid(list(SOLVED_STATE[:-1]) + [4], 'nine')
+
+    def test_solvers_reject_unsolvable_state(self):
+        twisted = bytearray(SOLVED_STATE)
+        twisted[8], twisted[9], twisted[20] = 1, 2, 0
+        for solve in (a_star_solve, ida_star_solve, two_phase_solve, bidirectional_solve, parallel_a_star_solve):
+            with self.subTest(solver=solve.__name__):
+                start = time.time()
+                with self.assertRaises(ValueError):
+                    solve(RubiksCube(twisted), timeout=5)
+                self.assertLess(time.time() - start, 1)
+                # Every face one colour, but not a cube: must not pass as already solved
+                with self.assertRaises(ValueError):
+                    solve(RubiksCube([0] * 54), timeout=5)
+        with self.assertRaises(ValueError):
+            next(anytime_solve(RubiksCube([0] * 54), timeout=5))
+
+    def test_facelet_strings(self):
+        after_r = 'UUFUUFUUFRRRRRRRRRFFDFFDFFDDDBDDBDDBLLLLLLLLLUBBUBBUBB'
+        self.assertEqual(format_facelets(SOLVED_STATE.apply('R')), after_r)
+        self.assertEqual(parse_facelets(after_r), SOLVED_STATE.apply('R'))
+        state = self.scrambled()
+        self.assertEqual(parse_facelets(format_facelets(state)), state)
+        self.assertEqual(format_facelets(RubiksCube(state).state), format_facelets(state))
+        # Colour letters work too: each centre names its face
+        colours = after_r.translate(str.maketrans('URFDLB', 'WRGYOB'))
+        self.assertEqual(parse_facelets(colours[:27] + '\n' + colours[27:]), SOLVED_STATE.apply('R'))
+        for bad in (after_r[:-1], 'U' * 54, after_r[:-1] + 'X'):
+            with self.subTest(bad=bad):
+                self.assertRaises(ValueError, parse_facelets, bad)
+
+    def test_move_notation(self):
+        self.assertEqual(parse_moves("R U2 F' B2' "), ['R', 'U2', "F'", 'B2'])
+        self.assertEqual(parse_moves(''), [])
+        with self.assertRaisesRegex(ValueError, 'X'):
+            parse_moves("R X U")
+        moves = parse_moves("R U2 F' L")
+        cube = RubiksCube()
+        apply_moves(cube, moves)
+        self.assertEqual(SOLVED_STATE.apply_moves(moves), CubeState.from_cube(cube))
+
+
+class TestOptimize(unittest.TestCase):
+
+    def test_normalize(self):
+        cases = [("U D U'", ['D']), ("R L R", ['R2', 'L']), ("R U D U' D' R'", []),
+                 ("F B F' B'", []), ("R2' R", ["R'"]), ("L R", ['R', 'L'])]
+        for text, expected in cases:
+            with self.subTest(moves=text):
+                self.assertEqual(optimize.normalize(parse_moves(text)), expected)
+        self.assertEqual(optimize.normalize(['R', 'R', 'R'], 'qtm'), ["R'"])
+        self.assertEqual(optimize.normalize(['U2', 'D'], 'qtm'), ['U', 'U', 'D'])
+
+    def test_window_replacement(self):
+        # (R2 U2) x 3 is its own inverse, so five repetitions equal the last two pairs inverted
+        self.assertEqual(optimize.optimize_solution(parse_moves("R2 U2 " * 5)), ['U2', 'R2'])
+        self.assertRaises(ValueError, optimize.optimize_solution, ['R'], 'stm')
+
+    def test_same_effect_never_longer(self):
+        import random
+        rng = random.Random(3)
+        for metric in ('htm', 'qtm'):
+            moves = endgame.METRIC_MOVES[metric]
+            for _ in range(20):
+                sequence = [rng.choice(moves) for _ in range(20)]
+                with self.subTest(metric=metric, sequence=sequence):
+                    result = optimize.optimize_solution(sequence, metric)
+                    self.assertLessEqual(len(result), len(sequence))
+                    self.assertTrue(set(result) <= set(moves))
+                    self.assertEqual(SOLVED_STATE.apply_moves(result), SOLVED_STATE.apply_moves(sequence))
+
+    def test_shallow_table(self):
+        # The in-memory fallback used when no endgame table is on disk still finds short windows
+        table = endgame.EndgameTable('htm', 3, endgame._build_records('htm', 3))
+        moves = parse_moves("R2 U2 " * 5)
+        start, end, replacement = optimize._shorter_window(moves, table, optimize.MAX_WINDOW)
+        self.assertLess(len(replacement), end - start)
+        self.assertEqual(SOLVED_STATE.apply_moves(replacement), SOLVED_STATE.apply_moves(moves[start:end]))
+        self.assertIsNone(optimize._shorter_window(parse_moves("R U F L B D"), table, optimize.MAX_WINDOW))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,182 @@
+# twophase.py
+
+import time
+from cube import CubeState
+from cubie import (MOVE_NAMES, N_MOVE, N_SLICE, PHASE2_MOVES, U_EDGES, D_EDGES,
+                   merge_ud_edges, move_table, slice_classes, twist_conj_table, verify_state)
+from endgame import endgame_table
+from pruning import packed_entry, pattern_database, twist_slice_index
+
+# G1 has diameter 18 in the phase-2 moves, but deep phase 2 searches are slow in
+# Python; a slightly longer phase 1 always reaches a G1 state with a short phase 2.
+MAX_PHASE2_DEPTH = 12
+_IS_PHASE2_MOVE = [m in PHASE2_MOVES for m in range(N_MOVE)]
+
+
+class _Stop(Exception):
+    """Unwinds the search on deadline or once a short-enough solution is found."""
+
+
+def _allowed(m, last_face):
+    """Skip a second turn of the same face, and opposite faces in descending order."""
+    face = m // 3
+    return face != last_face and face + 3 != last_face
+
+
+def prepare_tables():
+    """Build or load every table the search uses (a one-time cost, kept out of timeouts)."""
+    for coord in ('twist', 'flip', 'slice', 'slice_sorted', 'corners', 'ud_edges'):
+        move_table(coord)
+    for name in ('twist_slice_htm', 'flip_slice_htm', 'corners_slice_p2', 'ud_edges_slice_p2'):
+        pattern_database(name)
+    twist_conj_table()
+    slice_classes()
+
+
+def two_phase_solve(start_cube, max_depth=30, timeout=10, target_length=None):
+    """
+    Kociemba's two-phase algorithm (half-turn metric, solutions may contain X2).
+    - Phase 1 searches into the subgroup G1 = <U, D, R2, F2, L2, B2>
+      (corners and edges oriented, UD-slice edges in the slice).
+    - Phase 2 solves G1 using only U, D and half turns.
+    The first solution usually arrives in well under a second. The search then
+    keeps trying longer phase 1 solutions with shorter phase 2 budgets until the
+    deadline, a solution of at most `target_length` moves, or proof that no
+    shorter two-phase solution exists. Returns the best solution found (at most
+    `max_depth` moves) or None.
+    Short scrambles inside the half-turn endgame table (if built) get the
+    optimal solution by table walk instead. An unsolvable state raises ValueError.
+    """
+    cubie = verify_state(start_cube.state)
+    if start_cube.is_solved():
+        return []
+    endgame = endgame_table('htm')
+    if endgame is not None:
+        solution = endgame.solve(CubeState.from_cube(start_cube))
+        if solution is not None:
+            return solution if len(solution) <= max_depth else None
+    prepare_tables()
+    best = [None]
+
+    def on_solution(moves, nodes):
+        best[0] = moves
+        return target_length is not None and len(moves) <= target_length
+
+    two_phase_search(cubie, max_depth, time.time() + timeout, on_solution)
+    return best[0]
+
+
+def two_phase_search(cubie, max_depth, deadline, on_solution, cancel=None, progress=None):
+    """
+    Core search. Calls on_solution(moves, nodes) with every strictly shorter
+    solution (list of move names) and the nodes expanded so far; a truthy
+    return value stops the search. It also stops at the deadline or once the
+    optional `cancel` event is set. The optional progress(nodes) is called
+    every 1024 nodes. Returns True if it ran to completion (no shorter
+    two-phase solution within the phase 2 depth cap).
+    """
+    twist_move, flip_move, slice_move = move_table('twist'), move_table('flip'), move_table('slice')
+    slice_sorted_move, corners_move = move_table('slice_sorted'), move_table('corners')
+    ud_edges_move = move_table('ud_edges')
+    # Packed 4-bit pattern databases, read with packed_entry
+    pdb_twist = pattern_database('twist_slice_htm').data
+    pdb_flip = pattern_database('flip_slice_htm').data
+    pdb_corners = pattern_database('corners_slice_p2').data
+    pdb_ud_edges = pattern_database('ud_edges_slice_p2').data
+    twist_slice = twist_slice_index()
+
+    start_slice_sorted = cubie.get_slice_sorted()
+    start_corners = cubie.get_corners()
+    start_u = cubie.get_edge_group(U_EDGES)
+    start_d = cubie.get_edge_group(D_EDGES)
+
+    def h1(twist, flip, slc):
+        return max(packed_entry(pdb_twist, twist_slice(twist, slc)), packed_entry(pdb_flip, flip * N_SLICE + slc))
+
+    def h2(corners, ud_edges, slc):
+        return max(packed_entry(pdb_corners, corners * 24 + slc), packed_entry(pdb_ud_edges, ud_edges * 24 + slc))
+
+    path1, path2 = [], []
+    best_len = max_depth + 1
+    nodes = 0
+
+    def check():
+        """Every 1024 nodes: stop at the deadline or on cancel, else report progress."""
+        if time.time() > deadline or cancel is not None and cancel.is_set():
+            raise _Stop
+        if progress is not None:
+            progress(nodes)
+
+    def phase2(corners, ud_edges, slc, togo, last_face):
+        nonlocal nodes
+        if togo == 0:
+            return not (corners or ud_edges or slc)
+        nodes += 1
+        if not nodes & 1023:
+            check()
+        for m in PHASE2_MOVES:
+            if not _allowed(m, last_face):
+                continue
+            ncorners = corners_move[N_MOVE * corners + m]
+            nud = ud_edges_move[N_MOVE * ud_edges + m]
+            nslc = slice_sorted_move[N_MOVE * slc + m]
+            if h2(ncorners, nud, nslc) >= togo:
+                continue
+            path2.append(m)
+            if phase2(ncorners, nud, nslc, togo - 1, m // 3):
+                return True
+            path2.pop()
+        return False
+
+    def start_phase2():
+        nonlocal best_len
+        # Replay phase 1 on the coordinates phase 2 needs
+        slc, corners, u, d = start_slice_sorted, start_corners, start_u, start_d
+        for m in path1:
+            slc = slice_sorted_move[N_MOVE * slc + m]
+            corners = corners_move[N_MOVE * corners + m]
+            u = slice_sorted_move[N_MOVE * u + m]
+            d = slice_sorted_move[N_MOVE * d + m]
+        ud_edges = merge_ud_edges(u, d)
+        limit = min(best_len - 1 - len(path1), MAX_PHASE2_DEPTH)
+        last_face = path1[-1] // 3 if path1 else -1
+        for togo in range(h2(corners, ud_edges, slc), limit + 1):
+            if phase2(corners, ud_edges, slc, togo, last_face):
+                best_len = len(path1) + togo
+                moves = [MOVE_NAMES[m] for m in path1 + path2]
+                path2.clear()
+                if on_solution(moves, nodes):
+                    raise _Stop
+                return
+
+    def phase1(twist, flip, slc, togo, last_face):
+        nonlocal nodes
+        if togo == 0:
+            # A phase 1 ending in a G1 move was already covered by a shorter phase 1
+            if not (twist or flip or slc) and not (path1 and _IS_PHASE2_MOVE[path1[-1]]):
+                start_phase2()
+            return
+        nodes += 1
+        if not nodes & 1023:
+            check()
+        for m in range(N_MOVE):
+            if not _allowed(m, last_face):
+                continue
+            ntwist = twist_move[N_MOVE * twist + m]
+            nflip = flip_move[N_MOVE * flip + m]
+            nslc = slice_move[N_MOVE * slc + m]
+            if h1(ntwist, nflip, nslc) >= togo:
+                continue
+            path1.append(m)
+            phase1(ntwist, nflip, nslc, togo - 1, m // 3)
+            path1.pop()
+
+    start = (cubie.get_twist(), cubie.get_flip(), cubie.get_slice())
+    depth = h1(*start)
+    try:
+        while depth < best_len:
+            phase1(*start, depth, -1)
+            depth += 1
+    except _Stop:
+        return False
+    return True